@@ -0,0 +1,258 @@
+import copy
+import time
+import zlib
+import logging
+import struct
+import zipfile
+import tempfile
+from collections import deque
+
+# Block size used when copying compressed data between archives.
+CHUNK_SIZE = 1024 * 1024
+# Compressed bytes of a member transformed ahead that are kept in memory, the rest spills to a temporary file. With
+# the window of two members per thread, the rewrite holds at most threads * 2 * SPOOL_SIZE bytes.
+SPOOL_SIZE = 4 * 1024 * 1024
+
+_FILE_HEADER_SIZE = 30
+_ZIP64_EXTRA_ID = 0x0001
+_DATA_DESCRIPTOR_FLAG = 0x08
+_LZMA_EOS_FLAG = 0x02
+
+
+def rewrite_archive(source, target, transforms, compression=None, compresslevel=None, timings=None, threads=1):
+    """
+    Copies the members of a ZIP archive into a new archive, one member at a time, applying a transform to the
+    selected members. Nothing is extracted to disk and the members without a transform whose compression method
+    does not change are copied as raw compressed data.
+
+    With more than one thread, the transformed members are decompressed, transformed and compressed on a thread
+    pool, since zlib releases the GIL, and appended to the archive as raw data in their original order. Up to two
+    members per thread are kept ahead of the one being appended, each one in memory up to SPOOL_SIZE and in a
+    temporary file beyond it.
+
+    Args:
+        source (str | file): Path or binary file object of the original archive.
+        target (str | file): Path or binary file object where the new archive is written.
+        transforms (dict): Maps member names to factories of stream transformers. A transformer has a feed(chunk)
+            method that returns the output for each chunk and a flush() method that returns the remaining output.
+        compression (int): zipfile compression method for the output members. None keeps the method of each member.
+        compresslevel (int): Level used for the members that are compressed again. None uses the zlib default.
+        timings (dict): If given, the seconds spent opening the archives ('open'), rewriting the transformed members
+            ('rewrite_sheets') and writing everything else ('write_archive') are added to it.
+        threads (int): Threads transforming members at the same time.
+
+    Returns:
+        list: Names of the members that were transformed.
+    """
+    modified = []
+    start = time.perf_counter()
+    rewrite_seconds = 0.0
+    executor = None
+    with zipfile.ZipFile(source, "r") as zip_in, zipfile.ZipFile(target, "w") as zip_out:
+        opened = time.perf_counter()
+        selected = deque(info for info in zip_in.infolist() if info.filename in transforms)
+        transformed = {}
+        if threads > 1 and len(selected) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(threads, thread_name_prefix="rewrite")
+        try:
+            for info in zip_in.infolist():
+                transform = transforms.get(info.filename)
+                if transform is None and compression in (None, info.compress_type):
+                    copy_member_raw(zip_in, zip_out, info)
+                    continue
+                if transform is None:
+                    stream_member(zip_in, zip_out, info, None, compression, compresslevel)
+                    continue
+                logging.debug("Rewriting member: %s", info.filename)
+                member_start = time.perf_counter()
+                if executor is None:
+                    stream_member(zip_in, zip_out, info, transform(), compression, compresslevel)
+                else:
+                    while selected and len(transformed) < threads * 2:
+                        ahead = selected.popleft()
+                        transformed[ahead.filename] = executor.submit(
+                            transform_member, zip_in, ahead, transforms[ahead.filename](), compression,
+                            compresslevel)
+                    member, data = transformed.pop(info.filename).result()
+                    with data:
+                        data.seek(0)
+                        append_raw_member(zip_out, member, iter(lambda: data.read(CHUNK_SIZE), b""))
+                rewrite_seconds += time.perf_counter() - member_start
+                modified.append(info.filename)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+                # Members transformed ahead of a failure, their temporary files are removed on close.
+                for future in transformed.values():
+                    if not future.cancelled() and future.exception() is None:
+                        future.result()[1].close()
+    if timings is not None:
+        timings["open"] = timings.get("open", 0.0) + opened - start
+        timings["rewrite_sheets"] = timings.get("rewrite_sheets", 0.0) + rewrite_seconds
+        timings["write_archive"] = (timings.get("write_archive", 0.0)
+                                    + time.perf_counter() - opened - rewrite_seconds)
+    return modified
+
+
+def stream_member(zip_in, zip_out, info, transformer=None, compression=None, compresslevel=None):
+    """
+    Decompresses a member in chunks of CHUNK_SIZE, optionally passes it through a stream transformer, and
+    compresses it into the output archive, so memory stays bounded whatever the size of the member.
+
+    Args:
+        zip_in (zipfile.ZipFile): Archive opened for reading.
+        zip_out (zipfile.ZipFile): Archive opened for writing.
+        info (zipfile.ZipInfo): Member of zip_in to be copied.
+        transformer: Object with feed(chunk) and flush() methods, or None to copy the data unchanged.
+        compression (int): zipfile compression method of the output member. None keeps the method of the member.
+        compresslevel (int): Compression level of the output member. None uses the zlib default.
+    """
+    member = _output_member(info, compression, compresslevel)
+    # Used by zipfile to decide whether ZIP64 is needed, the transforms never grow a member noticeably.
+    member.file_size = info.file_size
+    with zip_in.open(info) as source, zip_out.open(member, "w") as target:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            target.write(transformer.feed(chunk) if transformer is not None else chunk)
+        if transformer is not None:
+            target.write(transformer.flush())
+
+
+def transform_member(zip_in, info, transformer, compression=None, compresslevel=None):
+    """
+    Decompresses a member in chunks of CHUNK_SIZE, passes it through a stream transformer and compresses the result
+    into a spooled temporary file, in memory up to SPOOL_SIZE, ready to be appended with append_raw_member. Several
+    threads can transform members of the same zip_in at the same time, zipfile serialises the reads of the underlying
+    file.
+
+    Args:
+        zip_in (zipfile.ZipFile): Archive opened for reading.
+        info (zipfile.ZipInfo): Member of zip_in to be transformed.
+        transformer: Object with feed(chunk) and flush() methods.
+        compression (int): zipfile compression method of the output member. None keeps the method of the member.
+        compresslevel (int): Compression level of the output member. None uses the zlib default.
+
+    Returns:
+        tuple: (zipfile.ZipInfo, tempfile.SpooledTemporaryFile) with the CRC and sizes of the output member, and its
+            compressed data. The caller closes the file.
+    """
+    member = _output_member(info, compression, compresslevel)
+    compressor = zipfile._get_compressor(member.compress_type, compresslevel)
+    output = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+    crc = 0
+    size = 0
+    with zip_in.open(info) as source:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            data = transformer.feed(chunk) if chunk else transformer.flush()
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+            output.write(compressor.compress(data) if compressor is not None else data)
+            if not chunk:
+                break
+    if compressor is not None:
+        output.write(compressor.flush())
+    member.CRC = crc
+    member.file_size = size
+    member.compress_size = output.tell()
+    return member, output
+
+
+def copy_member_raw(zip_in, zip_out, info):
+    """
+    Copies a member byte for byte as compressed data, keeping its CRC, sizes and compression method. The local
+    header is written with the final sizes, so the data descriptor of the source (if any) is not needed.
+
+    The source file is read under the lock of zip_in, so members can be transformed by other threads meanwhile.
+
+    Args:
+        zip_in (zipfile.ZipFile): Archive opened for reading.
+        zip_out (zipfile.ZipFile): Archive opened for writing.
+        info (zipfile.ZipInfo): Member of zip_in to be copied.
+    """
+    member = copy.copy(info)
+    member.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+    member.extra = _strip_zip64_extra(info.extra)
+    append_raw_member(zip_out, member, _iter_raw_data(zip_in, info))
+
+
+def append_raw_member(zip_out, member, chunks):
+    """
+    Appends a member whose compressed data is already available, with the CRC and sizes set in member.
+
+    zipfile has no public API for this, so the member is appended the same way ZipFile.write does it.
+
+    Args:
+        zip_out (zipfile.ZipFile): Archive opened for writing.
+        member (zipfile.ZipInfo): Member to be appended, with CRC, file_size and compress_size set.
+        chunks (iterable): Compressed data of the member, compress_size bytes in total.
+    """
+    if zip_out._writing:
+        raise ValueError("Can't write to the ZIP file while there is another write handle open on it.")
+    if zip_out._seekable:
+        zip_out.fp.seek(zip_out.start_dir)
+    member.header_offset = zip_out.fp.tell()
+    zip_out._writecheck(member)
+    zip_out._didModify = True
+    zip_out.fp.write(member.FileHeader())
+    for chunk in chunks:
+        zip_out.fp.write(chunk)
+    zip_out.filelist.append(member)
+    zip_out.NameToInfo[member.filename] = member
+    zip_out.start_dir = zip_out.fp.tell()
+
+
+def _output_member(info, compression, compresslevel):
+    """ Builds the ZipInfo of the rewritten copy of a member. """
+    member = zipfile.ZipInfo(info.filename, info.date_time)
+    member.compress_type = info.compress_type if compression is None else compression
+    member._compresslevel = compresslevel
+    member.external_attr = info.external_attr
+    member.comment = info.comment
+    if member.compress_type == zipfile.ZIP_LZMA:
+        member.flag_bits |= _LZMA_EOS_FLAG
+    return member
+
+
+def _iter_raw_data(zip_in, info):
+    """ Yields the compressed data of a member in chunks of CHUNK_SIZE, reading under the lock of zip_in. """
+    source = zip_in.fp
+    with zip_in._lock:
+        source.seek(info.header_offset)
+        header = source.read(_FILE_HEADER_SIZE)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    position = info.header_offset + _FILE_HEADER_SIZE + name_length + extra_length
+    remaining = info.compress_size
+    while remaining > 0:
+        with zip_in._lock:
+            source.seek(position)
+            chunk = source.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated data for member {info.filename}")
+        position += len(chunk)
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _strip_zip64_extra(extra):
+    """
+    Removes the ZIP64 field from the extra data of a member, FileHeader adds it again when it is needed.
+
+    Args:
+        extra (bytes): Extra data of the member.
+
+    Returns:
+        bytes: Extra data without the ZIP64 field.
+    """
+    stripped = b""
+    position = 0
+    while position + 4 <= len(extra):
+        field_id, field_length = struct.unpack("<HH", extra[position:position + 4])
+        end = position + 4 + field_length
+        if field_id != _ZIP64_EXTRA_ID:
+            stripped += extra[position:end]
+        position = end
+    return stripped
@@ -0,0 +1,242 @@
+import os
+import logging
+from file_processor import FileProcessor
+
+# FileProcessor of each worker process, created once by init_worker.
+_worker_processor = None
+
+
+def init_worker(compression=FileProcessor.compression_keep, compresslevel=None, skip_unprotected=True,
+                sheet_threads=1, result_cache=None, hash_results=False):
+    """
+    Initializer of the worker processes of BatchProcessor and UnlockService. Creates the FileProcessor that the
+    process uses for every file, see worker_processor.
+    """
+    global _worker_processor
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    _worker_processor = FileProcessor(compression, compresslevel, skip_unprotected=skip_unprotected,
+                                      sheet_threads=sheet_threads, result_cache=result_cache,
+                                      hash_results=hash_results)
+
+
+def worker_processor():
+    """ FileProcessor of the current worker process, created by init_worker. """
+    return _worker_processor
+
+
+def _unlock_file(file_path, range_sheets, output_path=None):
+    """ Unlocks one file inside a worker process and returns its result as a plain dict. """
+    unlocked_sheets, msg = _worker_processor.process_single_file(file_path, range_sheets, output_path)
+    return BatchProcessor.makeResult(file_path, unlocked_sheets, msg, _worker_processor.last_report)
+
+
+class BatchProcessor:
+    """
+    Unlocks many files on a pool of worker processes, each one running FileProcessor.process_single_file.
+    """
+
+    def __init__(self, workers=None, compression=FileProcessor.compression_keep, compresslevel=None,
+                 max_retries=1, metrics=None, skip_unprotected=True, journal=None, read_ahead=0, write_behind=4,
+                 memory_cap=None, sheet_threads=1, result_cache=None, manifest_cache=None, keep_pool=False):
+        """
+        Args:
+            workers (int): Number of worker processes. None uses the number of CPUs, 1 processes the files in the
+                calling process without a pool.
+            compression (str): Compression policy passed to FileProcessor.
+            compresslevel (int): Compression level passed to FileProcessor.
+            max_retries (int): Times a file is submitted again after its worker process died.
+            metrics (UnlockMetrics): If given, the result of every file is recorded in it, in the calling process.
+            skip_unprotected (bool): Leaves the files without protected sheets untouched, see FileProcessor.
+            journal (RunJournal): If given, files unchanged since they were last processed are left out and every
+                result is recorded in it. The files are hashed for it where they are processed, see
+                FileProcessor.hash_results.
+            read_ahead (int): If greater than 0, the files are unlocked in the calling process by an UnlockPipeline
+                that keeps this many workbooks read ahead, and workers is its number of transform threads. Meant
+                for network shares, where reading and writing take as long as unlocking.
+            write_behind (int): Unlocked workbooks waiting to be written, for the pipeline.
+            memory_cap (int): Bytes of originals and unlocked copies held in memory by the pipeline. None uses its
+                default.
+            sheet_threads (int): Threads rewriting the sheets of each workbook, see FileProcessor.
+            result_cache (ResultCache): Cache of unlocked workbooks by content, see FileProcessor. Each worker
+                process opens the same cache directory.
+            manifest_cache (ManifestCache): Cache of workbook metadata for the files processed in the calling
+                process (workers=1), e.g. the one that already validated them. Worker processes keep their own.
+            keep_pool (bool): Keeps the worker processes alive from one run to the next until close is called,
+                so long-lived callers such as the folder watcher do not start a new pool for every batch.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self.max_retries = max_retries
+        self.metrics = metrics
+        self.skip_unprotected = skip_unprotected
+        self.journal = journal
+        self.read_ahead = read_ahead
+        self.write_behind = write_behind
+        self.memory_cap = memory_cap
+        self.sheet_threads = sheet_threads
+        self.result_cache = result_cache
+        self.manifest_cache = manifest_cache
+        self.keep_pool = keep_pool
+        self._executor = None
+
+    @staticmethod
+    def makeResult(file_path, unlocked_sheets, msg, report=None):
+        """
+        Builds the result of one file.
+
+        Args:
+            file_path (str): Path to the file.
+            unlocked_sheets (list): Sheets unlocked, empty if the file failed.
+            msg (str): Message for the user.
+            report (dict): FileProcessor.last_report of the file.
+
+        Returns:
+            dict: Keys file, ok, unlocked_sheets, message plus the keys of the report.
+        """
+        result = dict(report or {})
+        result.update(file=file_path, ok=bool(unlocked_sheets), unlocked_sheets=unlocked_sheets, message=msg)
+        return result
+
+    def run(self, files, range_sheets=None, output_path_for=None):
+        """
+        Unlocks the files and yields the result of each one as soon as it completes, not in input order. Files are
+        taken lazily from the iterable, so it can be a generator that is still discovering files.
+
+        Args:
+            files (iterable): Paths of the files to be unlocked.
+            range_sheets (str): Range of sheets to be unlocked in every file. None or "" unlocks all the sheets.
+            output_path_for (callable): Maps each file to the path where its unlocked copy is written, it runs in
+                the calling process. None replaces the original files.
+
+        Yields:
+            dict: Result of each file, see makeResult.
+        """
+        output_path_for = output_path_for or (lambda file_path: None)
+        if self.journal is not None:
+            files = self.journal.pending(files, lambda file_path: self.journalOptions(file_path, range_sheets,
+                                                                                      output_path_for))
+        for result in self._run(files, range_sheets, output_path_for):
+            if self.metrics is not None:
+                self.metrics.record(result)
+            if self.journal is not None:
+                self.journal.record(result, self.journalOptions(result["file"], range_sheets, output_path_for))
+            yield result
+
+    def journalOptions(self, file_path, range_sheets, output_path_for):
+        """ Digest of the options of this run for a file, so the journal reprocesses it when they change. """
+        return self.journal.optionsDigest(range_sheets, output_path_for(file_path) or file_path, self.compression,
+                                          self.compresslevel, self.skip_unprotected)
+
+    def _run(self, files, range_sheets, output_path_for):
+        if self.read_ahead > 0:
+            yield from self._runPipeline(files, range_sheets, output_path_for)
+            return
+        if self.workers == 1:
+            processor = FileProcessor(self.compression, self.compresslevel, self.manifest_cache,
+                                      skip_unprotected=self.skip_unprotected, sheet_threads=self.sheet_threads,
+                                      result_cache=self.result_cache, hash_results=self.journal is not None)
+            for file_path in files:
+                unlocked_sheets, msg = processor.process_single_file(file_path, range_sheets,
+                                                                     output_path_for(file_path))
+                yield self.makeResult(file_path, unlocked_sheets, msg, processor.last_report)
+            return
+        yield from self._runPool(iter(files), range_sheets, output_path_for)
+
+    def _runPipeline(self, files, range_sheets, output_path_for):
+        from pipeline import DEFAULT_MEMORY_CAP, UnlockPipeline
+        pipeline = UnlockPipeline(self.compression, self.compresslevel, self.skip_unprotected, self.workers,
+                                  self.read_ahead, self.write_behind, self.memory_cap or DEFAULT_MEMORY_CAP,
+                                  sheet_threads=self.sheet_threads, result_cache=self.result_cache,
+                                  hash_results=self.journal is not None)
+        outcomes = pipeline.run(files, range_sheets, output_path_for)
+        try:
+            for file_path, unlocked_sheets, msg, report in outcomes:
+                yield self.makeResult(file_path, unlocked_sheets, msg, report)
+        finally:
+            # Stops the pipeline threads when the caller closes this generator.
+            outcomes.close()
+
+    def _createExecutor(self):
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                   initargs=(self.compression, self.compresslevel, self.skip_unprotected,
+                                             self.sheet_threads, self.result_cache, self.journal is not None))
+
+    def _runPool(self, files, range_sheets, output_path_for):
+        """
+        Keeps up to two files per worker in flight. When a worker process dies the whole pool breaks, so the files
+        that were in flight become suspects and are retried one at a time to find the one that kills the worker.
+        """
+        # Imported here so a run with workers=1 (and the CLI on a single file) does not load multiprocessing.
+        from concurrent.futures import FIRST_COMPLETED, wait
+        from concurrent.futures.process import BrokenProcessPool
+        max_pending = self.workers * 2
+        attempts = {}
+        suspects = []
+        pending = {}
+        executor = self._executor or self._createExecutor()
+        if self.keep_pool:
+            self._executor = executor
+
+        def submit(file_path):
+            pending[executor.submit(_unlock_file, file_path, range_sheets, output_path_for(file_path))] = file_path
+
+        try:
+            while True:
+                if suspects:
+                    if not pending:
+                        submit(suspects.pop(0))
+                else:
+                    while len(pending) < max_pending:
+                        file_path = next(files, None)
+                        if file_path is None:
+                            break
+                        submit(file_path)
+                if not pending:
+                    break
+                isolated = len(pending) == 1
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    file_path = pending.pop(future)
+                    try:
+                        yield future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        if not isolated:
+                            suspects.append(file_path)
+                            continue
+                        attempts[file_path] = attempts.get(file_path, 0) + 1
+                        if attempts[file_path] <= self.max_retries:
+                            logging.warning(f"Worker died while processing {file_path}, retrying")
+                            suspects.append(file_path)
+                        else:
+                            msg = f"Error al desbloquear el archivo {file_path}: el proceso de trabajo terminó."
+                            logging.error(msg)
+                            yield self.makeResult(file_path, [], msg)
+                    except Exception as e:
+                        msg = f"Error al desbloquear el archivo {file_path}: {e}"
+                        logging.error(msg)
+                        yield self.makeResult(file_path, [], msg)
+                if broken:
+                    suspects.extend(pending.values())
+                    pending.clear()
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = self._createExecutor()
+                    if self.keep_pool:
+                        self._executor = executor
+        finally:
+            if self.keep_pool:
+                # The pool stays for the next run, only the files of this one that were not started are dropped.
+                for future in pending:
+                    future.cancel()
+                wait(pending)
+            else:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def close(self):
+        """ Shuts down the pool kept with keep_pool. The processor can still be used, a new pool is started. """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,340 @@
+"""
+Benchmark of FileProcessor and BatchProcessor on synthetic protected workbooks.
+
+Usage:
+    python -m benchmark [--matrix quick|full] [--output results.json] [--baseline baseline.json] [--tolerance 0.1]
+    python -m benchmark --startup 10
+
+Results are written as JSON. With --baseline, every case whose throughput dropped more than the tolerance is
+reported as a regression and the exit code is 1. --startup launches the GUI that many times instead and measures
+how long the window takes to appear, which is a regression above STARTUP_BUDGET seconds.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import zipfile
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Each case is a workbook shape: number of sheets, rows per sheet, bytes of embedded media and shared strings.
+MATRICES = {
+    "quick": [
+        {"name": "small", "sheets": 3, "rows": 100, "media_bytes": 0, "shared_strings": 50},
+        {"name": "media", "sheets": 3, "rows": 100, "media_bytes": 2_000_000, "shared_strings": 50},
+    ],
+    "full": [
+        {"name": "small", "sheets": 3, "rows": 100, "media_bytes": 0, "shared_strings": 50},
+        {"name": "many_sheets", "sheets": 200, "rows": 50, "media_bytes": 0, "shared_strings": 500},
+        {"name": "large_sheet", "sheets": 2, "rows": 200_000, "media_bytes": 0, "shared_strings": 1000},
+        {"name": "media", "sheets": 3, "rows": 100, "media_bytes": 20_000_000, "shared_strings": 50},
+        {"name": "strings", "sheets": 5, "rows": 20_000, "media_bytes": 0, "shared_strings": 100_000},
+    ],
+}
+
+# Metrics compared against the baseline, higher is better.
+COMPARED_METRICS = ("files_per_s", "mb_per_s")
+# Seconds until the window is shown, median of the launches.
+STARTUP_BUDGET = 0.5
+
+_SPREADSHEET_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_RELATIONSHIPS_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PACKAGE_RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+
+def generate_workbook(path, sheets=3, rows=100, media_bytes=0, shared_strings=50, seed=0):
+    """
+    Writes a protected .xlsx workbook with the given shape. Every sheet has a <sheetProtection> element.
+
+    Args:
+        path (str): Path of the workbook to be created.
+        sheets (int): Number of worksheets.
+        rows (int): Rows per worksheet, each one with a number and a shared string.
+        media_bytes (int): Size of an embedded image made of random (incompressible) bytes, 0 for none.
+        shared_strings (int): Number of distinct shared strings.
+        seed (int): Seed of the random data, so that the same shape always produces the same file.
+    """
+    rng = random.Random(seed)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        overrides = "".join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, sheets + 1))
+        archive.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Default Extension="png" ContentType="image/png"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/sharedStrings.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+            f'{overrides}</Types>'))
+        archive.writestr("_rels/.rels", (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="{_PACKAGE_RELS_NS}">'
+            f'<Relationship Id="rId1" Type="{_RELATIONSHIPS_NS}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'))
+        sheet_entries = "".join(f'<sheet name="Hoja{i}" sheetId="{i}" r:id="rId{i}"/>' for i in range(1, sheets + 1))
+        archive.writestr("xl/workbook.xml", (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<workbook xmlns="{_SPREADSHEET_NS}" xmlns:r="{_RELATIONSHIPS_NS}"><sheets>{sheet_entries}</sheets>'
+            '</workbook>'))
+        relationships = "".join(
+            f'<Relationship Id="rId{i}" Type="{_RELATIONSHIPS_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+            for i in range(1, sheets + 1))
+        relationships += (f'<Relationship Id="rId{sheets + 1}" Type="{_RELATIONSHIPS_NS}/sharedStrings" '
+                          'Target="sharedStrings.xml"/>')
+        archive.writestr("xl/_rels/workbook.xml.rels", (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<Relationships xmlns="{_PACKAGE_RELS_NS}">{relationships}</Relationships>'))
+        with archive.open("xl/sharedStrings.xml", "w") as strings:
+            strings.write((f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><sst xmlns="{_SPREADSHEET_NS}" '
+                           f'count="{shared_strings}" uniqueCount="{shared_strings}">').encode())
+            for i in range(shared_strings):
+                strings.write(f"<si><t>Texto {i} {rng.getrandbits(64):x}</t></si>".encode())
+            strings.write(b"</sst>")
+        for sheet in range(1, sheets + 1):
+            with archive.open(f"xl/worksheets/sheet{sheet}.xml", "w") as worksheet:
+                worksheet.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                                f'<worksheet xmlns="{_SPREADSHEET_NS}"><sheetData>'.encode())
+                for row in range(1, rows + 1):
+                    worksheet.write(f'<row r="{row}"><c r="A{row}"><v>{rng.random()}</v></c>'
+                                    f'<c r="B{row}" t="s"><v>{row % max(shared_strings, 1)}</v></c></row>'.encode())
+                worksheet.write(b'</sheetData><sheetProtection sheet="1" objects="1" scenarios="1"/></worksheet>')
+        if media_bytes:
+            archive.writestr("xl/media/image1.png", rng.randbytes(media_bytes), zipfile.ZIP_STORED)
+
+
+def peak_rss_mb(children=False):
+    """
+    Peak resident set size of this process (or of its finished children), in MB. None where it is not available.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in KB on Linux and in bytes on macOS.
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def bench_single(template, workdir, iterations):
+    """
+    Unlocks fresh copies of a workbook one at a time with FileProcessor and times every stage.
+
+    Returns:
+        dict: Throughput and mean time per stage.
+    """
+    from file_processor import FileProcessor
+    processor = FileProcessor()
+    stages = {"copy_input": 0.0}
+    total_bytes = 0
+    elapsed = 0.0
+    for i in range(iterations):
+        path = os.path.join(workdir, f"single_{i}.xlsx")
+        start = time.perf_counter()
+        shutil.copyfile(template, path)
+        stages["copy_input"] += time.perf_counter() - start
+        total_bytes += os.path.getsize(path)
+        unlocked_sheets, msg = processor.process_single_file(path)
+        if not unlocked_sheets:
+            raise RuntimeError(msg)
+        elapsed += processor.last_report["seconds"]
+        for stage, seconds in processor.last_report["stages"].items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+        os.remove(path)
+    return {
+        "files": iterations,
+        "seconds": elapsed,
+        "files_per_s": iterations / elapsed,
+        "mb_per_s": total_bytes / 1e6 / elapsed,
+        "stage_seconds": {stage: seconds / iterations for stage, seconds in stages.items()},
+    }
+
+
+def bench_batch(template, workdir, files, workers, read_ahead=0):
+    """
+    Unlocks a directory of copies of a workbook with BatchProcessor, on the process pool or, if read_ahead is
+    greater than 0, on the in-process I/O pipeline.
+
+    Returns:
+        dict: Throughput of the whole batch.
+    """
+    from batch_processor import BatchProcessor
+    paths = []
+    for i in range(files):
+        path = os.path.join(workdir, f"batch_{i}.xlsx")
+        shutil.copyfile(template, path)
+        paths.append(path)
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    start = time.perf_counter()
+    results = list(BatchProcessor(workers, read_ahead=read_ahead).run(paths))
+    elapsed = time.perf_counter() - start
+    failed = [result["message"] for result in results if not result["ok"]]
+    if failed:
+        raise RuntimeError(failed[0])
+    for path in paths:
+        os.remove(path)
+    return {
+        "files": files,
+        "workers": workers or os.cpu_count(),
+        "seconds": elapsed,
+        "files_per_s": files / elapsed,
+        "mb_per_s": total_bytes / 1e6 / elapsed,
+    }
+
+
+def run_benchmark(matrix, iterations, batch_files, workers, read_ahead=0):
+    """
+    Runs every case of a matrix in the single-file and batch modes, and in the pipeline mode if read_ahead is
+    greater than 0.
+
+    Returns:
+        dict: Environment and per-case results, ready to be dumped as JSON.
+    """
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "cases": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="excel_breaker_bench_") as workdir:
+        for case in matrix:
+            template = os.path.join(workdir, f"{case['name']}.xlsx")
+            start = time.perf_counter()
+            generate_workbook(template, case["sheets"], case["rows"], case["media_bytes"], case["shared_strings"])
+            logging.info(f"Generated {case['name']} in {time.perf_counter() - start:.2f} s")
+            results["cases"][case["name"]] = {
+                "shape": case,
+                "input_mb": os.path.getsize(template) / 1e6,
+                "single": bench_single(template, workdir, iterations),
+                "batch": bench_batch(template, workdir, batch_files, workers),
+            }
+            if read_ahead:
+                results["cases"][case["name"]]["pipeline"] = bench_batch(template, workdir, batch_files, workers,
+                                                                         read_ahead)
+    results["peak_rss_mb"] = peak_rss_mb()
+    results["peak_rss_workers_mb"] = peak_rss_mb(children=True)
+    return results
+
+
+def bench_startup(launches):
+    """
+    Launches the GUI in new processes, each one exits as soon as its window is shown. Without a display the Qt
+    offscreen platform is used.
+
+    Args:
+        launches (int): Number of launches, the first one also warms the disk cache.
+
+    Returns:
+        dict: Median and worst seconds until the window was shown, and until the process exited.
+    """
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    env = dict(os.environ)
+    if sys.platform.startswith("linux") and not (env.get("DISPLAY") or env.get("WAYLAND_DISPLAY")):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    shown, process = [], []
+    for _ in range(launches):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, main_path, "--measure-startup"], cwd=os.path.dirname(main_path),
+                                   env=env, capture_output=True, text=True)
+        process.append(time.perf_counter() - start)
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "GUI failed")
+        shown.append(json.loads(completed.stdout.strip().splitlines()[-1])["window_shown_s"])
+    return {
+        "launches": launches,
+        "window_shown_s": statistics.median(shown),
+        "window_shown_max_s": max(shown),
+        "process_s": statistics.median(process),
+    }
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    Compares the throughput of every case with a stored baseline.
+
+    Args:
+        results (dict): Output of run_benchmark.
+        baseline (dict): Output of a previous run_benchmark.
+        tolerance (float): Allowed relative drop, 0.1 means 10 %.
+
+    Returns:
+        list: Description of each regression, empty if there is none.
+    """
+    regressions = []
+    startup, base_startup = results.get("startup"), baseline.get("startup")
+    if startup and base_startup:
+        current, reference = startup["window_shown_s"], base_startup["window_shown_s"]
+        if current > reference * (1 + tolerance):
+            regressions.append(f"startup/window_shown_s: {current:.3f} > {reference:.3f} "
+                               f"({(current / reference - 1) * 100:.1f}%)")
+    for name, case in results.get("cases", {}).items():
+        base_case = baseline.get("cases", {}).get(name)
+        if base_case is None:
+            continue
+        for mode in ("single", "batch", "pipeline"):
+            if mode not in case:
+                continue
+            for metric in COMPARED_METRICS:
+                current = case[mode][metric]
+                reference = base_case.get(mode, {}).get(metric)
+                if reference and current < reference * (1 - tolerance):
+                    regressions.append(f"{name}/{mode}/{metric}: {current:.2f} < {reference:.2f} "
+                                       f"({(current / reference - 1) * 100:.1f}%)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmark", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--matrix", choices=sorted(MATRICES), default="quick", help="Workbook shapes to run.")
+    parser.add_argument("--iterations", type=int, default=5, help="Files unlocked one by one per case.")
+    parser.add_argument("--batch-files", type=int, default=20, help="Files unlocked with the pool per case.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes of the batch mode.")
+    parser.add_argument("--read-ahead", type=int, default=0,
+                        help="Also runs the batch on the I/O pipeline with this read-ahead depth.")
+    parser.add_argument("--startup", type=int, default=0, metavar="N",
+                        help="Only measures the GUI startup, over N launches.")
+    parser.add_argument("--output", help="Writes the results to this file instead of stdout.")
+    parser.add_argument("--baseline", help="Results of a previous run to compare with.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative drop (default 0.1).")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    regressions = []
+    if args.startup:
+        results = {"python": platform.python_version(), "platform": platform.platform(),
+                   "startup": bench_startup(args.startup)}
+        if results["startup"]["window_shown_s"] > STARTUP_BUDGET:
+            regressions.append(f"startup/window_shown_s: {results['startup']['window_shown_s']:.3f} > "
+                               f"budget {STARTUP_BUDGET}")
+    else:
+        results = run_benchmark(MATRICES[args.matrix], args.iterations, args.batch_files, args.workers,
+                                args.read_ahead)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions += compare_with_baseline(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Compiles the Qt Designer files into Python modules, so the window does not parse XML on every launch.
+
+Usage:
+    python -m build_ui           # regenerates the modules
+    python -m build_ui --check   # exit code 1 if a module is out of date with its .ui file
+
+Run it after every change to a file in ui/ and commit the generated modules with it.
+"""
+import io
+import os
+import sys
+import argparse
+
+# Designer file -> generated module, relative to this directory.
+UI_MODULES = {
+    os.path.join("ui", "unlockFile.ui"): "ui_unlock_file.py",
+}
+# Designer stores the icons relative to the .ui file, the application loads them relative to this directory.
+ICON_PATHS = ('"icons/', '"ui/icons/')
+
+
+def compile_ui(base, ui_file):
+    """
+    Args:
+        base (str): Directory of the application.
+        ui_file (str): Path of the Designer file, relative to base.
+
+    Returns:
+        str: Source of the generated module.
+    """
+    from PyQt6 import uic
+    source = io.StringIO()
+    with open(os.path.join(base, ui_file), encoding="utf-8") as f:
+        uic.compileUi(f, source)
+    # The header names the .ui file with the path it was opened with, kept relative so the output is reproducible.
+    return source.getvalue().replace(os.path.join(base, ui_file), ui_file).replace(*ICON_PATHS)
+
+
+def _code(source):
+    """ Drops the comment header, which carries the pyuic6 version, so --check does not depend on it. """
+    return source[source.find("\nfrom "):] if source is not None else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="build_ui", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--check", action="store_true", help="Only checks that the modules are up to date.")
+    args = parser.parse_args(argv)
+    base = os.path.dirname(os.path.abspath(__file__))
+    stale = []
+    for ui_file, module in UI_MODULES.items():
+        source = compile_ui(base, ui_file)
+        module_path = os.path.join(base, module)
+        try:
+            with open(module_path, encoding="utf-8") as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if _code(current) == _code(source):
+            continue
+        if args.check:
+            stale.append(module)
+            print(f"{module} is out of date with {ui_file}, run python -m build_ui", file=sys.stderr)
+        else:
+            with open(module_path, "w", encoding="utf-8") as f:
+                f.write(source)
+            print(f"{ui_file} -> {module}")
+    return 1 if stale else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+"""
+Headless entry point, for cron jobs and CI runners without a display. Never imports Qt.
+
+Usage:
+    python -m cli unlock PATH [PATH ...] [--sheets 1,3-5] [--workers N] [--compression keep|deflate|stored]
+                         [--output-dir DIR]
+    python -m cli watch DIR [--sheets 1,3-5] [--workers N] [--settle 2] [--output-dir DIR] [--existing]
+    python -m cli serve [--host 127.0.0.1] [--port 8080] [--workers N] [--queue N] [--max-size MB]
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime
+
+COMPRESSION_CHOICES = ("keep", "deflate", "stored")
+# Files between two updates of the Prometheus file during long runs.
+PROMETHEUS_EVERY = 1000
+
+
+def build_parser():
+    """
+    Builds the command line parser.
+
+    Returns:
+        argparse.ArgumentParser: Parser with one subcommand per mode.
+    """
+    parser = argparse.ArgumentParser(prog="cli", description="Excel Breaker: desbloquea hojas de archivos .xlsx.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Muestra el log detallado.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    unlock = subparsers.add_parser("unlock", help="Desbloquea archivos o directorios.")
+    unlock.add_argument("paths", nargs="+", metavar="PATH", help="Archivo .xlsx o directorio a desbloquear.")
+    unlock.add_argument("--sheets", default="",
+                        help="Intervalo de hojas, por ejemplo 1,3-5. Por defecto se desbloquean todas.")
+    unlock.add_argument("--workers", type=int, default=None,
+                        help="Cantidad de procesos. Por defecto uno por núcleo, 1 no usa procesos.")
+    unlock.add_argument("--compression", choices=COMPRESSION_CHOICES, default="keep",
+                        help="Compresión del archivo de salida (por defecto keep).")
+    unlock.add_argument("--level", type=int, default=None, choices=range(10), metavar="0-9",
+                        help="Nivel de compresión de las partes que se vuelven a comprimir.")
+    unlock.add_argument("--no-scan", action="store_true",
+                        help="Reescribe los archivos aunque no tengan hojas protegidas. Un único archivo se "
+                             "reescribe siempre, sin revisarlo antes.")
+    unlock.add_argument("--include", action="append", metavar="GLOB",
+                        help="Patrón de los archivos a desbloquear dentro de los directorios, se puede repetir "
+                             "(por defecto *.xlsx).")
+    unlock.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="Patrón de archivos o directorios a omitir, contra el nombre o la ruta relativa. Se "
+                             "puede repetir.")
+    unlock.add_argument("--min-size", type=int, default=None, metavar="KB", help="Omite los archivos más chicos.")
+    unlock.add_argument("--max-size", type=int, default=None, metavar="KB", help="Omite los archivos más grandes.")
+    unlock.add_argument("--modified-after", type=parse_date, default=None, metavar="YYYY-MM-DD",
+                        help="Solo los archivos modificados después de esta fecha.")
+    unlock.add_argument("--modified-before", type=parse_date, default=None, metavar="YYYY-MM-DD",
+                        help="Solo los archivos modificados antes de esta fecha.")
+    unlock.add_argument("--scan-threads", type=int, default=8, metavar="N",
+                        help="Directorios que se recorren a la vez (por defecto 8).")
+    unlock.add_argument("--sheet-threads", type=int, default=None, metavar="N",
+                        help="Hilos que reescriben las hojas de un mismo archivo (por defecto 1). Cada hilo puede "
+                             "retener en memoria hasta 8 MB de hojas reescritas.")
+    unlock.add_argument("--read-ahead", type=int, default=0, metavar="N",
+                        help="Desbloquea en este proceso, leyendo N archivos por adelantado mientras otros se "
+                             "procesan y se escriben. Pensado para carpetas de red; --workers pasa a ser la "
+                             "cantidad de hilos de procesamiento.")
+    unlock.add_argument("--write-behind", type=int, default=4, metavar="N",
+                        help="Archivos desbloqueados que pueden esperar a ser escritos con --read-ahead.")
+    unlock.add_argument("--memory-cap", type=int, default=256, metavar="MB",
+                        help="Memoria máxima ocupada por los archivos en curso con --read-ahead (por defecto 256).")
+    unlock.add_argument("--output-dir", metavar="DIR",
+                        help="Directorio donde se escriben los archivos desbloqueados. Por defecto se reemplazan "
+                             "los originales.")
+    unlock.add_argument("--journal", metavar="FILE",
+                        help="Base SQLite con el estado de cada archivo. Solo se procesan los archivos nuevos, "
+                             "modificados o que fallaron, y una ejecución interrumpida continúa donde quedó.")
+    unlock.add_argument("--cache-dir", metavar="DIR",
+                        help="Caché local de resultados por contenido: las copias idénticas de un archivo ya "
+                             "desbloqueado se copian desde ella en lugar de procesarse otra vez.")
+    unlock.add_argument("--cache-size", type=int, default=1024, metavar="MB",
+                        help="Tamaño máximo de la caché, se descartan primero los resultados menos usados "
+                             "(por defecto 1024).")
+    unlock.add_argument("--json", action="store_true", help="Escribe el resultado de cada archivo como JSON.")
+    unlock.add_argument("--metrics-jsonl", metavar="FILE",
+                        help="Agrega el reporte de cada archivo (tiempos por etapa, bytes, hojas) a este archivo.")
+    unlock.add_argument("--metrics-prom", metavar="FILE",
+                        help="Escribe los totales en formato Prometheus (textfile collector) en este archivo.")
+    unlock.set_defaults(handler=run_unlock)
+
+    watch = subparsers.add_parser("watch", help="Vigila una carpeta y desbloquea los archivos a medida que llegan.")
+    watch.add_argument("directory", metavar="DIR", help="Carpeta a vigilar, con sus subcarpetas.")
+    watch.add_argument("--sheets", default="",
+                       help="Intervalo de hojas, por ejemplo 1,3-5. Por defecto se desbloquean todas.")
+    watch.add_argument("--workers", type=int, default=None,
+                       help="Cantidad de procesos. Por defecto uno por núcleo, 1 no usa procesos.")
+    watch.add_argument("--compression", choices=COMPRESSION_CHOICES, default="keep",
+                       help="Compresión del archivo de salida (por defecto keep).")
+    watch.add_argument("--level", type=int, default=None, choices=range(10), metavar="0-9",
+                       help="Nivel de compresión de las partes que se vuelven a comprimir.")
+    watch.add_argument("--output-dir", metavar="DIR",
+                       help="Directorio donde se escriben los archivos desbloqueados. Por defecto se reemplazan "
+                            "los originales.")
+    watch.add_argument("--settle", type=float, default=2.0, metavar="SECONDS",
+                       help="Segundos que un archivo debe permanecer sin cambios antes de procesarlo (por defecto 2).")
+    watch.add_argument("--batch-window", type=float, default=1.0, metavar="SECONDS",
+                       help="Segundos que se esperan más archivos antes de procesar un lote (por defecto 1).")
+    watch.add_argument("--existing", action="store_true",
+                       help="Desbloquea también los archivos que ya están en la carpeta al iniciar.")
+    watch.add_argument("--poll", type=float, default=None, metavar="SECONDS",
+                       help="Revisa la carpeta cada tantos segundos en lugar de usar inotify, por ejemplo en "
+                            "carpetas de red escritas desde otros equipos.")
+    watch.add_argument("--no-recursive", action="store_true", help="No vigila las subcarpetas.")
+    watch.add_argument("--json", action="store_true", help="Escribe el resultado de cada archivo como JSON.")
+    watch.set_defaults(handler=run_watch)
+
+    serve = subparsers.add_parser("serve", help="Servicio HTTP local que desbloquea los archivos subidos.")
+    serve.add_argument("--host", default="127.0.0.1", help="Interfaz donde escuchar (por defecto 127.0.0.1).")
+    serve.add_argument("--port", type=int, default=8080, help="Puerto donde escuchar (por defecto 8080).")
+    serve.add_argument("--workers", type=int, default=None, help="Cantidad de procesos. Por defecto uno por núcleo.")
+    serve.add_argument("--queue", type=int, default=None, metavar="N",
+                       help="Pedidos que pueden esperar un proceso libre, el resto recibe 503. Por defecto dos por "
+                            "proceso.")
+    serve.add_argument("--max-size", type=int, default=100, metavar="MB",
+                       help="Tamaño máximo de un archivo subido, los mayores reciben 413 (por defecto 100).")
+    serve.add_argument("--timeout", type=float, default=None, metavar="SECONDS",
+                       help="Tiempo máximo de un pedido, pasado el cual se responde 504.")
+    serve.add_argument("--compression", choices=COMPRESSION_CHOICES, default="keep",
+                       help="Compresión de los archivos devueltos (por defecto keep).")
+    serve.add_argument("--level", type=int, default=None, choices=range(10), metavar="0-9",
+                       help="Nivel de compresión de las partes que se vuelven a comprimir.")
+    serve.set_defaults(handler=run_serve)
+    return parser
+
+
+def parse_date(value):
+    """
+    Parses a date given on the command line.
+
+    Returns:
+        float: Timestamp of the date, local time.
+    """
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha inválida: {value}")
+
+
+def iter_files(paths, discovery=None):
+    """
+    Expands the paths given on the command line: files are yielded as they are and directories are walked
+    concurrently by a FileDiscovery, streaming the workbooks as they are found. Temporary files left by an
+    interrupted run are removed on the way.
+
+    Args:
+        paths (list): Files and directories.
+        discovery (FileDiscovery): Patterns and filters for the files inside directories. None finds every .xlsx.
+
+    Yields:
+        str: Path of each workbook.
+    """
+    from file_discovery import FileDiscovery
+    discovery = discovery or FileDiscovery()
+    directories = [path for path in paths if os.path.isdir(path)]
+    yield from (path for path in paths if not os.path.isdir(path))
+    yield from discovery.discover(directories)
+
+
+def output_mapper(paths, output_dir):
+    """
+    Builds the function that maps each file to its path in the output directory. Files found under a directory
+    given on the command line keep their path relative to it, other files go directly into output_dir.
+
+    Args:
+        paths (list): Files and directories given on the command line.
+        output_dir (str): Output directory, None to replace the original files.
+
+    Returns:
+        callable: Function from a file path to its output path, or None.
+    """
+    if not output_dir:
+        return None
+    from file_processor import FileProcessor
+    roots = [os.path.abspath(path) for path in paths if os.path.isdir(path)]
+
+    def output_path_for(file_path):
+        absolute = os.path.abspath(file_path)
+        root = next((root for root in roots if absolute.startswith(root + os.sep)), None)
+        return FileProcessor.outputPathFor(file_path, output_dir, root)
+    return output_path_for
+
+
+def print_result(result, as_json=False):
+    """
+    Prints the result of one file, as a status and message line or as JSON.
+
+    Args:
+        result (dict): Result of the file, see BatchProcessor.makeResult.
+        as_json (bool): Prints the whole result as one JSON line.
+    """
+    if as_json:
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+    else:
+        status = "ERROR " if not result["ok"] else "SKIP  " if result.get("skipped") else "OK    "
+        print(status + result["message"], flush=True)
+
+
+def run_unlock(args):
+    """
+    Unlocks the files of the unlock subcommand and prints one line per file.
+
+    Returns:
+        int: 0 if every file was unlocked, 1 otherwise.
+    """
+    # Imported here so that --help and argument errors do not pay for loading the processing modules.
+    from batch_processor import BatchProcessor
+    from metrics import JsonLinesSink, UnlockMetrics
+    from run_journal import RunJournal
+    from result_cache import ResultCache
+    from file_discovery import DEFAULT_INCLUDE, FileDiscovery
+    sinks = [JsonLinesSink(args.metrics_jsonl)] if args.metrics_jsonl else []
+    metrics = UnlockMetrics(sinks) if sinks or args.metrics_prom else None
+    single_file = len(args.paths) == 1 and not os.path.isdir(args.paths[0])
+    workers = 1 if single_file else args.workers
+    # The scan only pays off over many files, where it spares rewriting the unprotected ones. On a protected
+    # workbook it inflates the first protected sheet once more, so a single file is rewritten directly.
+    skip_unprotected = not args.no_scan and not single_file
+    sheet_threads = args.sheet_threads or 1
+    journal = RunJournal(args.journal) if args.journal else None
+    result_cache = ResultCache(args.cache_dir, args.cache_size * 1024 * 1024) if args.cache_dir else None
+    batch = BatchProcessor(workers, args.compression, args.level, metrics=metrics,
+                           skip_unprotected=skip_unprotected, journal=journal, read_ahead=args.read_ahead,
+                           write_behind=args.write_behind, memory_cap=args.memory_cap * 1024 * 1024,
+                           sheet_threads=sheet_threads, result_cache=result_cache)
+    discovery = FileDiscovery(args.include or DEFAULT_INCLUDE, args.exclude,
+                              args.min_size * 1024 if args.min_size is not None else None,
+                              args.max_size * 1024 if args.max_size is not None else None,
+                              args.modified_after, args.modified_before, args.scan_threads)
+    all_unlocked = True
+    try:
+        results = batch.run(iter_files(args.paths, discovery), args.sheets, output_mapper(args.paths, args.output_dir))
+        for done, result in enumerate(results, 1):
+            if not result["ok"]:
+                all_unlocked = False
+            print_result(result, args.json)
+            if args.metrics_prom and done % PROMETHEUS_EVERY == 0:
+                metrics.write_prometheus(args.metrics_prom)
+    finally:
+        if journal is not None:
+            journal.close()
+            print(f"{journal.unchanged} archivos sin cambios desde la última ejecución.", file=sys.stderr)
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
+        for sink in sinks:
+            sink.close()
+    return 0 if all_unlocked else 1
+
+
+def run_watch(args):
+    """
+    Unlocks the workbooks that land in a folder until interrupted, printing one line per file.
+
+    Returns:
+        int: 0 once interrupted.
+    """
+    from batch_processor import BatchProcessor
+    from folder_watcher import FolderWatcher, watch
+    watcher = FolderWatcher(args.directory, recursive=not args.no_recursive, settle=args.settle,
+                            batch_window=args.batch_window, poll=args.poll is not None,
+                            poll_interval=args.poll or 5.0)
+    # One pool for the whole watch, instead of starting the workers again for every batch.
+    batch = BatchProcessor(args.workers, args.compression, args.level, keep_pool=True)
+    logging.warning(f"Watching {args.directory}")
+    try:
+        for result in watch(watcher, batch, args.sheets, output_mapper([args.directory], args.output_dir),
+                            args.existing):
+            print_result(result, args.json)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        batch.close()
+    return 0
+
+
+def run_serve(args):
+    """
+    Runs the HTTP service of the serve subcommand until interrupted.
+
+    Returns:
+        int: 0 once the service stops.
+    """
+    from unlock_server import serve
+    serve(args.host, args.port, workers=args.workers, queue_size=args.queue, compression=args.compression,
+          compresslevel=args.level, max_bytes=args.max_size * 1024 * 1024, timeout=args.timeout)
+    return 0
+
+
+def main(argv=None):
+    """
+    Parses the command line and runs the selected subcommand.
+
+    Args:
+        argv (list): Arguments without the program name. None uses sys.argv.
+
+    Returns:
+        int: Exit code.
+    """
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
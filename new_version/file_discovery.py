@@ -0,0 +1,176 @@
+import os
+import queue
+import logging
+import threading
+from fnmatch import fnmatch
+from file_processor import FileProcessor
+
+DEFAULT_INCLUDE = ("*" + FileProcessor.ext_xlsx,)
+# Directories listed at the same time. Listing is I/O bound, on network shares most of the time is latency.
+DEFAULT_THREADS = 8
+# Paths found and not yet taken by the consumer. Discovery pauses when it gets this far ahead.
+QUEUE_SIZE = 10000
+# Seconds between two checks of cancel while the walk has not found anything.
+CANCEL_CHECK = 0.1
+# Prefix of the lock files Excel creates next to the workbooks it has open.
+LOCK_FILE_PREFIX = "~$"
+
+_END = object()
+
+
+def is_lock_file(name):
+    """ Tells whether a file name is an Excel lock file (~$name.xlsx). """
+    return name.startswith(LOCK_FILE_PREFIX)
+
+
+class FileDiscovery:
+    """
+    Finds the workbooks under one or more directories, listing subdirectories concurrently with os.scandir. Paths are
+    yielded as soon as they are found, so processing starts on the first workbook instead of after the whole walk.
+    """
+
+    def __init__(self, include=DEFAULT_INCLUDE, exclude=(), min_size=None, max_size=None, modified_after=None,
+                 modified_before=None, threads=DEFAULT_THREADS, remove_stale_temp=True):
+        """
+        Args:
+            include (iterable): Glob patterns, a file is kept if its name matches one of them.
+            exclude (iterable): Glob patterns matched against the name and against the path relative to the root.
+                Matching files are left out and matching directories are not entered.
+            min_size (int): Smallest file size in bytes, None for no limit.
+            max_size (int): Largest file size in bytes, None for no limit.
+            modified_after (float): Only files modified after this timestamp, None for no limit.
+            modified_before (float): Only files modified before this timestamp, None for no limit.
+            threads (int): Directories listed at the same time.
+            remove_stale_temp (bool): Removes the temporary files left by interrupted runs on the way.
+        """
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.modified_after = modified_after
+        self.modified_before = modified_before
+        self.threads = max(1, threads)
+        self.remove_stale_temp = remove_stale_temp
+        self.directories = 0
+        self.matched = 0
+        self._cancelled = threading.Event()
+
+    def excluded(self, name, relative):
+        """ Tells whether a file or directory matches an exclude pattern. """
+        return any(fnmatch(name, pattern) or fnmatch(relative, pattern) for pattern in self.exclude)
+
+    def wanted(self, entry, relative):
+        """
+        Applies the patterns and filters to a file.
+
+        Args:
+            entry (os.DirEntry): File found by os.scandir.
+            relative (str): Path of the file relative to its root.
+
+        Returns:
+            bool: True if the file has to be yielded.
+        """
+        if is_lock_file(entry.name) or not any(fnmatch(entry.name, pattern) for pattern in self.include):
+            return False
+        if self.excluded(entry.name, relative):
+            return False
+        if (self.min_size is None and self.max_size is None and self.modified_after is None
+                and self.modified_before is None):
+            return True
+        try:
+            stat = entry.stat()
+        except OSError:
+            return False
+        return ((self.min_size is None or stat.st_size >= self.min_size)
+                and (self.max_size is None or stat.st_size <= self.max_size)
+                and (self.modified_after is None or stat.st_mtime > self.modified_after)
+                and (self.modified_before is None or stat.st_mtime < self.modified_before))
+
+    def cancel(self):
+        """
+        Stops the walk from any thread. Unlike closing the generator, it also works while the consumer is waiting
+        for the next path, e.g. in a large tree without matches: the generator returns within CANCEL_CHECK seconds.
+        """
+        self._cancelled.set()
+
+    def discover(self, roots):
+        """
+        Walks the roots concurrently. The order of the paths is not defined. Closing the generator or calling cancel
+        stops the walk.
+
+        Args:
+            roots (list): Directories to walk.
+
+        Yields:
+            str: Path of each workbook found.
+        """
+        roots = list(roots)
+        if not roots:
+            return
+        from concurrent.futures import ThreadPoolExecutor
+        found = queue.Queue(QUEUE_SIZE)
+        stop = threading.Event()
+        lock = threading.Lock()
+        # Directories submitted and not finished yet, the walk ends when it drops to zero.
+        pending = [len(roots)]
+        executor = ThreadPoolExecutor(self.threads, thread_name_prefix="discover")
+
+        def put(item):
+            try:
+                found.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            while not stop.is_set():
+                try:
+                    found.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def scan(directory, root):
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if stop.is_set() or self._cancelled.is_set():
+                            return
+                        relative = os.path.relpath(entry.path, root) if self.exclude else entry.name
+                        try:
+                            is_directory = entry.is_dir(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        if is_directory:
+                            if not self.excluded(entry.name, relative):
+                                with lock:
+                                    pending[0] += 1
+                                executor.submit(scan, entry.path, root)
+                        elif self.wanted(entry, relative):
+                            with lock:
+                                self.matched += 1
+                            put(entry.path)
+                        elif self.remove_stale_temp and FileProcessor.isTempFile(entry.name):
+                            FileProcessor.removeStaleTempFile(entry.path)
+            except OSError as e:
+                logging.warning(f"Could not list {directory}: {e}")
+            finally:
+                with lock:
+                    self.directories += 1
+                    pending[0] -= 1
+                    finished = pending[0] == 0
+                if finished:
+                    put(_END)
+
+        for root in roots:
+            executor.submit(scan, root, root)
+        try:
+            while not self._cancelled.is_set():
+                try:
+                    item = found.get(timeout=CANCEL_CHECK)
+                except queue.Empty:
+                    continue
+                if item is _END or self._cancelled.is_set():
+                    break
+                yield item
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
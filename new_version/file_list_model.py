@@ -0,0 +1,187 @@
+import os
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt, QTimer
+from PyQt6.QtGui import QColor
+from sheet_ranges import parse_sheet_range
+
+STATUS_PENDING = "Pendiente"
+STATUS_UNLOCKED = "Desbloqueado"
+STATUS_SKIPPED = "Sin protección"
+STATUS_FAILED = "Error"
+
+COLUMNS = ("Archivo", "Estado", "Tamaño", "Hojas", "Tiempo")
+COLUMN_FILE, COLUMN_STATUS, COLUMN_SIZE, COLUMN_SHEETS, COLUMN_TIME = range(len(COLUMNS))
+# Milliseconds between two refreshes of the view while results arrive.
+FLUSH_INTERVAL = 100
+
+
+class FileEntry:
+    """ State of one file of the list. """
+    __slots__ = ("path", "status", "size", "sheets", "seconds", "message")
+
+    def __init__(self, path):
+        self.path = path
+        self.status = STATUS_PENDING
+        # None until the row is first shown or the file is unlocked, -1 if the file cannot be read.
+        self.size = None
+        self.sheets = ""
+        self.seconds = None
+        self.message = ""
+
+
+def format_size(size):
+    """ Formats a size in bytes for the list, "" if it is not known. """
+    if size is None or size < 0:
+        return ""
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+class FileListModel(QAbstractTableModel):
+    """
+    Table of the files of a run with their status, size, sheets unlocked and time taken. Results are applied as they
+    arrive but the view is only told about them every FLUSH_INTERVAL ms, with one signal for all the rows that
+    changed, so a run over tens of thousands of files does not flood the view. Sizes are read when a row is first
+    shown, not when the files are added.
+    """
+
+    def __init__(self, parent=None):
+        super(FileListModel, self).__init__(parent)
+        self._entries = []
+        self._rows = {}
+        # Results of files that are not in the list yet, and rows changed since the last flush.
+        self._appended = []
+        self._changed_first = None
+        self._changed_last = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FLUSH_INTERVAL)
+        self._timer.timeout.connect(self.flush)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._entries)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self._entries[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == COLUMN_FILE:
+                return os.path.basename(entry.path)
+            if column == COLUMN_STATUS:
+                return entry.status
+            if column == COLUMN_SIZE:
+                if entry.size is None:
+                    try:
+                        entry.size = os.path.getsize(entry.path)
+                    except OSError:
+                        entry.size = -1
+                return format_size(entry.size)
+            if column == COLUMN_SHEETS:
+                return entry.sheets
+            if column == COLUMN_TIME:
+                return f"{entry.seconds:.2f} s" if entry.seconds is not None else ""
+        elif role == Qt.ItemDataRole.ToolTipRole:
+            return entry.message or entry.path
+        elif role == Qt.ItemDataRole.ForegroundRole and entry.status == STATUS_FAILED:
+            return QColor(180, 0, 0)
+        elif role == Qt.ItemDataRole.TextAlignmentRole and column in (COLUMN_SIZE, COLUMN_TIME):
+            return int(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        return None
+
+    def setFiles(self, paths):
+        """
+        Replaces the list. Repeated paths are only listed once.
+
+        Args:
+            paths (iterable): Paths of the files.
+        """
+        self._timer.stop()
+        self.beginResetModel()
+        self._entries = []
+        self._rows = {}
+        self._appended = []
+        self._changed_first = self._changed_last = None
+        for path in paths:
+            if path and path not in self._rows:
+                self._rows[path] = len(self._entries)
+                self._entries.append(FileEntry(path))
+        self.endResetModel()
+
+    def clear(self):
+        self.setFiles(())
+
+    def paths(self):
+        """
+        Returns:
+            list: Paths of the files, in the order they were added.
+        """
+        return [entry.path for entry in self._entries]
+
+    def resetStatus(self):
+        """ Marks every file as pending again, before a new run over the same list. """
+        self.flush()
+        for entry in self._entries:
+            entry.status = STATUS_PENDING
+            entry.sheets = ""
+            entry.seconds = None
+            entry.message = ""
+        if self._entries:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self._entries) - 1, len(COLUMNS) - 1))
+
+    def updateResult(self, result):
+        """
+        Applies the result of one file. Files that are not in the list, e.g. found while walking a directory, are
+        added at the end.
+
+        Args:
+            result (dict): Result of the file, see BatchProcessor.makeResult.
+        """
+        path = result["file"]
+        row = self._rows.get(path)
+        if row is None:
+            row = len(self._entries) + len(self._appended)
+            self._rows[path] = row
+            entry = FileEntry(path)
+            self._appended.append(entry)
+        else:
+            entry = self._entries[row] if row < len(self._entries) else self._appended[row - len(self._entries)]
+            self._changed_first = row if self._changed_first is None else min(self._changed_first, row)
+            self._changed_last = row if self._changed_last is None else max(self._changed_last, row)
+        if not result["ok"]:
+            entry.status = STATUS_FAILED
+        elif result.get("skipped"):
+            entry.status = STATUS_SKIPPED
+        else:
+            entry.status = STATUS_UNLOCKED
+        if result.get("input_bytes"):
+            entry.size = result["input_bytes"]
+        sheets = result.get("unlocked_sheets")
+        entry.sheets = str(parse_sheet_range(sheets)) if sheets and not result.get("skipped") else ""
+        entry.seconds = result.get("seconds")
+        entry.message = result.get("message", "")
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """ Tells the view about the rows added and changed since the last flush. """
+        self._timer.stop()
+        if self._appended:
+            first = len(self._entries)
+            self.beginInsertRows(QModelIndex(), first, first + len(self._appended) - 1)
+            self._entries.extend(self._appended)
+            self._appended = []
+            self.endInsertRows()
+        if self._changed_first is not None:
+            self.dataChanged.emit(self.index(self._changed_first, 0),
+                                  self.index(self._changed_last, len(COLUMNS) - 1))
+            self._changed_first = self._changed_last = None
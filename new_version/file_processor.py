@@ -1,56 +1,168 @@
+import io
 import os
-import zipfile
+import stat
 import shutil
+import hashlib
+import zipfile
 import logging
-import pandas as pd
+import tempfile
+import time
+from archive_rewriter import rewrite_archive
+from result_cache import file_digest
+from sheet_protection import SheetProtectionRemover, has_sheet_protection
+from sheet_ranges import SheetRange, parse_sheet_range
+from workbook_manifest import ManifestCache, read_workbook_manifest
 
 class FileProcessor:
     """
-    Class to handle file processing tasks such as extracting, modifying, and compressing files.
+    Class to handle file processing tasks such as validating, modifying and rewriting workbooks.
     """
-    ext_zip = '.zip'
     ext_xlsx = '.xlsx'
+    ext_tmp = '.tmp'
+    prefix_tmp = '.~unlock-'
+    compression_keep = 'keep'
+    compression_deflate = 'deflate'
+    compression_stored = 'stored'
+    compression_methods = {
+        compression_keep: None,
+        compression_deflate: zipfile.ZIP_DEFLATED,
+        compression_stored: zipfile.ZIP_STORED,
+    }
+
+    def __init__(self, compression=compression_keep, compresslevel=None, manifest_cache=None, metrics=None,
+                 skip_unprotected=True, sheet_threads=1, result_cache=None, hash_results=False):
+        """
+        Initializes the processor with the compression policy used to write the unlocked workbooks.
+
+        Args:
+            compression (str): 'keep' keeps the method of each member, 'deflate' deflates the members that are not
+                already deflated and 'stored' writes every member uncompressed, which is the fastest option.
+            compresslevel (int): zlib level (0-9) for the members that are compressed again. None uses the default.
+            manifest_cache (ManifestCache): Cache of workbook metadata shared by the validators and modifySheets.
+                A new cache is created when None.
+            metrics (UnlockMetrics): If given, the report of every processed file is recorded in it.
+            skip_unprotected (bool): Scans the requested sheets first and leaves the file untouched when none of
+                them is protected.
+            sheet_threads (int): Threads rewriting the sheets of one workbook at the same time. Worth it for a
+                single large workbook with many sheets; with many files, parallelism across files is cheaper.
+            result_cache (ResultCache): If given, the results are stored in it by the hash of the original workbook,
+                and a workbook already seen is copied from it instead of being unlocked again.
+            hash_results (bool): Leaves in last_report['sha256'] the SHA-256 of the file at file_path once it is
+                processed, unlocked in place or left as it was, so the run journal does not read it again.
+        """
+        if compression not in FileProcessor.compression_methods:
+            raise ValueError(f"Unknown compression policy: {compression}")
+        if compresslevel is not None and not 0 <= compresslevel <= 9:
+            raise ValueError(f"Compression level must be between 0 and 9: {compresslevel}")
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self.last_report = {}
+        self.manifest_cache = manifest_cache if manifest_cache is not None else ManifestCache()
+        self.metrics = metrics
+        self.skip_unprotected = skip_unprotected
+        self.sheet_threads = sheet_threads
+        self.result_cache = result_cache
+        self.hash_results = hash_results
+        self._buffer_manifest = (None, None)
+        self._source_digest = (None, None)
 
-    def process_single_file(self, file_path, range_sheets=None):
+    def process_single_file(self, file_path, range_sheets=None, output_path=None, workbook=None, writer=None):
         """
-        Processes a single file to unlock specified sheets.
+        Processes a single file to unlock specified sheets. The sizes, the time per stage and the outcome are left
+        in last_report.
 
         Args:
             file_path (str): Path to the file to be processed.
-            range_sheets (str): Range of sheets to be unlocked.
+            range_sheets (str | SheetRange): Range of sheets to be unlocked. None or "" unlocks all the sheets.
+            output_path (str): Where the unlocked workbook is written. None replaces the original file.
+            workbook (io.BytesIO): Content of file_path, already read into memory. None reads the file itself.
+            writer (callable): Takes over writing the unlocked workbook: it is called with a BytesIO holding it and
+                the destination path, and is responsible for committing it. None commits it here.
 
         Returns:
             list: List of unlocked sheets.
         """
+        start = time.perf_counter()
+        stages = {}
+        self.last_report = {"file": file_path, "ok": False, "compression": self.compression, "input_bytes": 0,
+                            "output_bytes": 0, "sheets_touched": 0, "skipped": False, "seconds": 0.0,
+                            "stages": stages}
         try:
-            if not os.path.exists(file_path):
+            if workbook is None and not os.path.exists(file_path):
                 msg = f"El archivo {file_path} no existe."
                 logging.error(msg)
                 return [], msg
+            source = file_path if workbook is None else workbook
+            cache_key = None
+            if self.result_cache is not None:
+                cache_key = self.cacheKey(source, range_sheets, stages)
+                if cache_key is not None:
+                    cached = self.unlockFromCache(file_path, cache_key, output_path, workbook, writer, stages)
+                    if cached is not None:
+                        return cached
             if range_sheets is None or range_sheets == "":
-                range_sheets = ",".join(map(str, range(1, self.sheetsLength(file_path) + 1)))
-                logging.info(f"range_sheets: {range_sheets}")
+                range_sheets = SheetRange.all(self.sheetsLength(source))
+                logging.debug("range_sheets: %s", range_sheets)
+                if not range_sheets:
+                    msg = f"No se pudieron leer las hojas del archivo {file_path}."
+                    logging.error(msg)
+                    return [], msg
             if self.inputFormatValidator(range_sheets):
-                if self.inputRangeValidator(range_sheets) and self.rangeSheetsValidator(file_path, range_sheets):
-                    logging.info("Validations passed")
-                    file_path_zip = self.changeExtension(file_path, FileProcessor.ext_zip)
-                    if file_path_zip != -1:
-                        logging.info("Extension changed")
-                        unzipped_directory = self.extractZip(file_path_zip)
-                        logging.info("Extraction completed")
-                        self.modifySheets(unzipped_directory, range_sheets)
-                        logging.info("Sheets modified")
-                        file_compressed_zip_format = self.compressandcreate(file_path_zip, unzipped_directory)
-                        file_unlocked_xlsx_format = self.changeExtension(file_compressed_zip_format,
-                                                                         FileProcessor.ext_xlsx)
-                        self.copyAndDelete(file_unlocked_xlsx_format, file_path)
-                        msg = f"El archivo {file_path} ha sido desbloqueado con éxito."
-                        logging.info(msg)
-                        return self.process_string(range_sheets), msg
+                valid = self.inputRangeValidator(range_sheets)
+                sheets = parse_sheet_range(range_sheets)
+                valid = valid and self.rangeSheetsValidator(source, sheets)
+                stages["validate"] = time.perf_counter() - start
+                if valid and self.skip_unprotected and not self.isProtected(source, sheets, stages):
+                    if cache_key is not None:
+                        self.result_cache.put(cache_key, {"sheets": str(sheets), "skipped": True})
+                    self.last_report["ok"] = True
+                    self.last_report["skipped"] = True
+                    msg = self.copyUnchanged(file_path, output_path, workbook, writer, stages)
+                    logging.info(msg)
+                    return list(sheets), msg
+                if valid:
+                    logging.debug("Validations passed")
+                    destination = output_path or file_path
+                    if workbook is None:
+                        self.last_report["input_bytes"] = os.path.getsize(file_path)
+
+                        def rewrite(unlocked_file):
+                            parts = self.modifySheets(file_path, unlocked_file, sheets, stages)
+                            logging.debug("Sheets modified")
+                            self.last_report["sheets_touched"] = len(parts)
+                            self.last_report["output_bytes"] = os.path.getsize(unlocked_file)
+                            if cache_key is not None:
+                                self.result_cache.put(cache_key, {"sheets": str(sheets), "sheets_touched": len(parts)},
+                                                      unlocked_file)
+                            self.hashResult(unlocked_file, destination, file_path, stages)
+                        self.writeFile(rewrite, destination, file_path, stages)
                     else:
-                        msg = f"Se detectó que quiere volver a desbloquear el archivo {file_path}. Primero elimine el archivo {FileProcessor.ext_zip}"
-                        logging.error(msg)
-                        return [], msg
+                        self.last_report["input_bytes"] = workbook.getbuffer().nbytes
+                        unlocked = io.BytesIO()
+                        parts = self.modifySheets(workbook, unlocked, sheets, stages)
+                        logging.debug("Sheets modified")
+                        self.last_report["sheets_touched"] = len(parts)
+                        self.last_report["output_bytes"] = unlocked.getbuffer().nbytes
+                        if cache_key is not None:
+                            self.result_cache.put(cache_key, {"sheets": str(sheets), "sheets_touched": len(parts)},
+                                                  unlocked)
+                        self.hashResult(unlocked, destination, file_path, stages)
+                        if writer is not None:
+                            writer(unlocked, destination)
+                        else:
+                            self.writeFile(unlocked, destination, file_path, stages)
+                    self.last_report["ok"] = True
+                    self.last_report["seconds"] = time.perf_counter() - start
+                    if output_path:
+                        self.last_report["output_path"] = output_path
+                    msg = (f"El archivo {file_path} ha sido desbloqueado con éxito. "
+                           f"({self.formatReport(self.last_report)})")
+                    logging.info(msg)
+                    return list(sheets), msg
+                else:
+                    msg = f"El intervalo de hojas {range_sheets} no es válido para el archivo {file_path}."
+                    logging.error(msg)
+                    return [], msg
             else:
                 msg = "Error en la validación del formato de entrada."
                 logging.error(msg)
@@ -59,124 +171,402 @@ class FileProcessor:
             msg = f"Error al desbloquear el archivo {file_path}: {e}"
             logging.error(msg)
             return [], msg
+        finally:
+            if self.hash_results and self.last_report["ok"] and "sha256" not in self.last_report:
+                # The file at file_path was left as it was.
+                try:
+                    self.last_report["sha256"] = self.contentDigest(file_path if workbook is None else workbook,
+                                                                    stages)
+                except OSError as e:
+                    logging.warning(f"Could not hash {file_path}: {e}")
+            self._buffer_manifest = (None, None)
+            self._source_digest = (None, None)
+            self.last_report["seconds"] = time.perf_counter() - start
+            if self.metrics is not None:
+                self.metrics.record(self.last_report)
+
+    def cacheKey(self, workbook, range_sheets, timings=None):
+        """
+        Hashes a workbook and builds its key in the result cache.
 
-    def changeExtension(self, file_path, ext):
-        """ Cambia la extensión del archivo al pasado por parámetro.
         Args:
-            file_path: Ruta entera del archivo, incluido el archivo.
-            ext: Extensión a la cual se quiere cambiar el archivo. Ejm.- .zip, .xlsx.
+            workbook (str | io.BytesIO): Path to the workbook, or its content.
+            range_sheets (str | SheetRange): Range of sheets to be unlocked. None or "" for all the sheets.
+            timings (dict): If given, the seconds spent hashing are added to it under 'hash'.
+
         Returns:
-            La ruta completa del archivo con la nueva extensión.
+            str: Key of the result, None if the range is malformed (the validators report it).
         """
-        logging.info(f"Changing extension of {file_path} with {ext}")
         try:
-            new_file_path = os.path.splitext(file_path)[0] + ext
-            if os.path.exists(new_file_path):
-                return -1
+            spec = "" if range_sheets is None or range_sheets == "" else str(parse_sheet_range(range_sheets))
+        except ValueError:
+            return None
+        return self.result_cache.key(self.contentDigest(workbook, timings), spec, self.compression, self.compresslevel,
+                                     self.skip_unprotected)
+
+    def contentDigest(self, content, timings=None):
+        """
+        Hashes a workbook. The digest of the workbook being processed is kept, so the cache key and the journal
+        share one read of it.
+
+        Args:
+            content (str | io.BytesIO): Path to the workbook, or its content.
+            timings (dict): If given, the seconds spent hashing are added to it under 'hash'.
+
+        Returns:
+            str: SHA-256 of the content, in hexadecimal.
+        """
+        if self._source_digest[0] is content:
+            return self._source_digest[1]
+        start = time.perf_counter()
+        if isinstance(content, str):
+            digest = file_digest(content)
+        else:
+            digest = hashlib.sha256(content.getbuffer()).hexdigest()
+        if timings is not None:
+            timings["hash"] = timings.get("hash", 0.0) + time.perf_counter() - start
+        self._source_digest = (content, digest)
+        return digest
+
+    def hashResult(self, unlocked, destination_path, file_path, timings=None):
+        """
+        With hash_results, records the digest of an unlocked workbook that is about to replace file_path.
+
+        Args:
+            unlocked (str | io.BytesIO): Temporary file or content of the unlocked workbook.
+            destination_path (str): Final path of the unlocked workbook.
+            file_path (str): Path of the original workbook.
+            timings (dict): If given, the seconds spent hashing are added to it under 'hash'.
+        """
+        if self.hash_results and os.path.abspath(destination_path) == os.path.abspath(file_path):
+            self.last_report["sha256"] = self.contentDigest(unlocked, timings)
+
+    def unlockFromCache(self, file_path, cache_key, output_path=None, workbook=None, writer=None, timings=None):
+        """
+        Finishes a file from the result cache, see process_single_file for the arguments.
+
+        Returns:
+            tuple: (unlocked sheets, message), or None if the result is not cached.
+        """
+        entry = self.result_cache.get(cache_key)
+        if entry is None:
+            return None
+        sheets = list(parse_sheet_range(entry["sheets"]))
+        if entry.get("skipped"):
+            msg = self.copyUnchanged(file_path, output_path, workbook, writer, timings)
+            self.last_report["ok"] = True
+            self.last_report["skipped"] = True
+            self.last_report["cached"] = True
+            logging.info(msg)
+            return sheets, msg
+        destination = output_path or file_path
+        start = time.perf_counter()
+        try:
+            # The copy, and the hash of the result for the journal, are counted as commit time.
+            if workbook is None:
+                self.last_report["input_bytes"] = os.path.getsize(file_path)
+                self.last_report["output_bytes"] = os.path.getsize(entry["path"])
+                self.hashResult(entry["path"], destination, file_path)
+                self.writeFile(entry["path"], destination, file_path)
             else:
-                os.rename(file_path, new_file_path)
-                return new_file_path
-        except Exception as e:
-            logging.error(f"Error changing file extension: {e}")
-            return -1
+                self.last_report["input_bytes"] = workbook.getbuffer().nbytes
+                with open(entry["path"], "rb") as f:
+                    unlocked = io.BytesIO(f.read())
+                self.last_report["output_bytes"] = unlocked.getbuffer().nbytes
+                self.hashResult(unlocked, destination, file_path)
+                if writer is not None:
+                    writer(unlocked, destination)
+                else:
+                    self.writeFile(unlocked, destination, file_path)
+        except FileNotFoundError:
+            # Evicted by another process in the meantime.
+            logging.debug("Cache entry %s vanished, unlocking %s", cache_key, file_path)
+            return None
+        finally:
+            if timings is not None:
+                timings["commit"] = timings.get("commit", 0.0) + time.perf_counter() - start
+        # Only set once the copy succeeded, a vanished entry is a miss and the file is unlocked normally.
+        self.last_report["cached"] = True
+        self.last_report["sheets_touched"] = entry.get("sheets_touched", 0)
+        self.last_report["ok"] = True
+        if output_path:
+            self.last_report["output_path"] = output_path
+        msg = (f"El archivo {file_path} ha sido desbloqueado con éxito desde la caché. "
+               f"({self.formatReport(self.last_report)})")
+        logging.info(msg)
+        return sheets, msg
+
+    def unlock_bytes(self, data, range_sheets=None):
+        """
+        Unlocks a workbook held in memory, without touching the filesystem.
+
+        Args:
+            data (bytes | bytearray | memoryview | file): Workbook, or a binary file object to read it from.
+            range_sheets (str | SheetRange | iterable): Sheets to be unlocked, e.g. "1,3-5" or [1, 3]. None or ""
+                unlocks all the sheets.
+
+        Returns:
+            bytes: Unlocked workbook. If none of the sheets is protected and skip_unprotected is set, the original
+                workbook is returned as it is.
+
+        Raises:
+            ValueError: If the range is malformed or exceeds the sheets of the workbook.
+            zipfile.BadZipFile: If data is not a workbook.
+        """
+        workbook = self._openWorkbook(data)
+        unlocked = io.BytesIO()
+        _, written = self._unlockWorkbook(workbook, unlocked, range_sheets)
+        if not written:
+            if isinstance(data, bytes):
+                return data
+            workbook.seek(0)
+            return workbook.read()
+        return unlocked.getvalue()
+
+    def unlock_stream(self, source, target, range_sheets=None):
+        """
+        Unlocks a workbook read from a binary stream and writes it to another one, without touching the filesystem.
+        The target does not need to be seekable, e.g. a socket or an HTTP response.
 
-    def extractZip(self, zip_file_path):
-        """ Extrae el contenido del archivo en la ruta especificada, si no existe la ruta esta se crea con el nombre
-        del archivo sin extensión.
         Args:
-            zip_file_path: Ruta del archivo .zip.
+            source (bytes | bytearray | memoryview | file): Workbook, or a binary file object to read it from. A
+                stream that cannot seek is read into memory first.
+            target (file): Binary file object where the unlocked workbook is written.
+            range_sheets (str | SheetRange | iterable): Sheets to be unlocked. None or "" unlocks all the sheets.
+
         Returns:
-            La ruta del directorio donde se extrajo el archivo .zip.
+            list: Sheets unlocked. If none of them is protected and skip_unprotected is set, the workbook is
+                copied unchanged.
+
+        Raises:
+            ValueError: If the range is malformed or exceeds the sheets of the workbook.
+            zipfile.BadZipFile: If source is not a workbook.
+        """
+        workbook = self._openWorkbook(source)
+        sheets, written = self._unlockWorkbook(workbook, target, range_sheets)
+        if not written:
+            workbook.seek(0)
+            shutil.copyfileobj(workbook, target, 1024 * 1024)
+        return list(sheets)
+
+    @staticmethod
+    def _openWorkbook(source):
+        """ Wraps bytes-like data in a BytesIO, and reads a stream that cannot seek into one. """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return io.BytesIO(source)
+        if not (hasattr(source, "seekable") and source.seekable()):
+            return io.BytesIO(source.read())
+        return source
+
+    def _sheetSelection(self, workbook, range_sheets):
+        """ Resolves and validates the sheets to be unlocked, raising ValueError if they are not valid. """
+        manifest = self.getManifest(workbook)
+        if range_sheets is None or range_sheets == "":
+            sheets = SheetRange.all(len(manifest))
+        else:
+            sheets = parse_sheet_range(range_sheets)
+        if not sheets:
+            raise ValueError("No hay hojas para desbloquear.")
+        if sheets.max > len(manifest):
+            raise ValueError(f"La hoja {sheets.max} excede la cantidad de hojas del documento ({len(manifest)}).")
+        return sheets
+
+    def _unlockWorkbook(self, workbook, target, range_sheets):
+        """
+        Writes the unlocked copy of a workbook held in a seekable file object.
+
+        Returns:
+            tuple: (SheetRange, bool) with the sheets of the range, and False if nothing was written because none
+                of them is protected.
         """
-        logging.info(f"Extracting zip file: {zip_file_path}")
         try:
-            extraction_path = os.path.splitext(zip_file_path)[0]
-            if not os.path.exists(extraction_path):
-                os.makedirs(extraction_path)
-            with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-                zip_ref.extractall(extraction_path)
-            return extraction_path
-        except Exception as e:
-            logging.error(f"Error extracting zip file: {e}")
-            return ""
+            sheets = self._sheetSelection(workbook, range_sheets)
+            if self.skip_unprotected and not self.isProtected(workbook, sheets):
+                logging.debug("No protected sheets, the workbook is left unchanged")
+                return sheets, False
+            self.modifySheets(workbook, target, sheets)
+            return sheets, True
+        finally:
+            self._buffer_manifest = (None, None)
 
-    def compressandcreate(self, zip_file_name, directory):
+    @staticmethod
+    def formatReport(report):
+        """ Describe el tamaño de entrada y salida y el tiempo empleado en desbloquear un archivo.
+        Args:
+            report: Diccionario con las claves input_bytes, output_bytes, seconds y compression.
+        Returns:
+            Texto del tipo '1200.0 KB -> 1180.5 KB (98.4%) en 0.05 s, compresión keep'.
         """
-        Compresses a directory into a zip file.
+        ratio = report["output_bytes"] / report["input_bytes"] * 100 if report["input_bytes"] else 0
+        return (f"{report['input_bytes'] / 1024:.1f} KB -> {report['output_bytes'] / 1024:.1f} KB ({ratio:.1f}%) "
+                f"en {report['seconds']:.2f} s, compresión {report['compression']}")
 
+    def createTempFile(self, file_path):
+        """ Crea un archivo temporal vacío en el directorio del archivo de destino, donde se escribe el libro
+        desbloqueado. Al estar en el mismo sistema de archivos, se puede confirmar con un único os.replace.
         Args:
-            zip_file_name (str): Name of the zip file to be created.
-            directory (str): Directory to be compressed.
+            file_path: Ruta entera del archivo de destino. Si su directorio no existe, se crea.
+        Returns:
+            La ruta completa del archivo temporal.
+        """
+        directory = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=FileProcessor.prefix_tmp, suffix=FileProcessor.ext_tmp, dir=directory)
+        os.close(fd)
+        logging.debug("Temporary file created: %s", temp_path)
+        return temp_path
+
+    def commitFile(self, unlocked_file, destination_path, original_path):
+        """
+        Moves the unlocked file to its destination with one atomic os.replace. The data is flushed to disk first,
+        so after a crash the destination holds either the old or the new workbook, never a partial one.
+
+        Args:
+            unlocked_file (str): Path to the unlocked temporary file, in the same directory as the destination.
+            destination_path (str): Final path of the unlocked workbook.
+            original_path (str): Path of the original workbook, its permissions are copied to the new file.
+        """
+        logging.debug("Committing %s to %s", unlocked_file, destination_path)
+        os.chmod(unlocked_file, stat.S_IMODE(os.stat(original_path).st_mode))
+        with open(unlocked_file, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(unlocked_file, destination_path)
+
+    def copyUnchanged(self, file_path, output_path=None, workbook=None, writer=None, timings=None):
+        """
+        Handles a workbook without protected sheets. It is left untouched when it would replace itself, and is
+        copied as it is to output_path otherwise, committed like an unlocked workbook. See process_single_file for
+        the arguments.
 
         Returns:
-            str: Path to the created zip file.
+            str: Message for the user.
+        """
+        if not output_path or os.path.abspath(output_path) == os.path.abspath(file_path):
+            return f"El archivo {file_path} no tiene hojas protegidas, no se modificó."
+        if workbook is not None:
+            size = workbook.getbuffer().nbytes
+            if writer is not None:
+                writer(workbook, output_path)
+            else:
+                self.writeFile(workbook, output_path, file_path, timings)
+        else:
+            size = os.path.getsize(file_path)
+            self.writeFile(file_path, output_path, file_path, timings)
+        self.last_report["input_bytes"] = self.last_report["output_bytes"] = size
+        self.last_report["output_path"] = output_path
+        return f"El archivo {file_path} no tiene hojas protegidas, se copió sin cambios a {output_path}."
+
+    def writeFile(self, unlocked, destination_path, original_path, timings=None):
+        """
+        Writes a workbook to a temporary file next to its destination and commits it with commitFile. The temporary
+        file is removed if anything fails.
+
+        Args:
+            unlocked (str | io.BytesIO | callable): Path of a file to be copied, workbook held in memory, or function
+                that writes the workbook to the temporary path it is called with.
+            destination_path (str): Final path of the workbook.
+            original_path (str): Path of the original workbook, its permissions are copied to the new file.
+            timings (dict): If given, the seconds spent copying or writing and committing are added to it under
+                'commit'. The time of a function is left to the function.
         """
-        logging.info(f"Compressing and creating zip file: {zip_file_name}")
+        seconds = 0.0
+        unlocked_file = self.createTempFile(destination_path)
         try:
-            zip_base_name = os.path.basename(zip_file_name)
-            logging.info(f"compressandcreate zip_file_name: {zip_base_name}")
-            directory = directory.replace("/", "\\")
-            logging.info(f"compressandcreate directory: {directory}")
-            full_zip_file_name = os.path.join(directory, zip_base_name)
-            logging.info(f"compressandcreate zip_file_name 2: {full_zip_file_name}")
-            logging.info(f"compressandcreate os.listdir(directory): {os.listdir(directory)}")
-
-            with zipfile.ZipFile(full_zip_file_name, "w") as zip_file:
-                for root, dirs, files in os.walk(directory):
-                    for filename in files:
-                        if filename == zip_base_name:
-                            continue
-                        file_path = os.path.join(root, filename)
-                        zip_file.write(file_path, arcname=os.path.relpath(file_path, directory))
-
-            logging.info(f"Ruta archivo unlocked: {full_zip_file_name}")
-            return full_zip_file_name
-        except Exception as e:
-            logging.error(f"Error compressing and creating zip file: {e}")
-            return ""
+            if callable(unlocked):
+                unlocked(unlocked_file)
+            else:
+                start = time.perf_counter()
+                if isinstance(unlocked, str):
+                    shutil.copyfile(unlocked, unlocked_file)
+                else:
+                    with open(unlocked_file, "wb") as f:
+                        f.write(unlocked.getbuffer())
+                seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            self.commitFile(unlocked_file, destination_path, original_path)
+            seconds += time.perf_counter() - start
+        finally:
+            if os.path.exists(unlocked_file):
+                os.remove(unlocked_file)
+            if timings is not None:
+                timings["commit"] = timings.get("commit", 0.0) + seconds
 
-    def copyAndDelete(self, unlocked_file, original_path):
+    @staticmethod
+    def outputPathFor(file_path, output_dir, input_root=None):
+        """ Calcula la ruta de salida de un archivo en el modo de directorio de salida separado.
+        Args:
+            file_path: Ruta del archivo original.
+            output_dir: Directorio de salida.
+            input_root: Directorio de entrada cuya estructura se replica en el de salida. Si es None o el archivo
+                no está dentro de él, el archivo se escribe directamente en output_dir.
+        Returns:
+            La ruta del archivo desbloqueado.
         """
-        Copies the unlocked file to the original path and deletes the temporary directory.
+        if input_root is not None:
+            relative = os.path.relpath(os.path.abspath(file_path), os.path.abspath(input_root))
+            if not relative.startswith(os.pardir):
+                return os.path.join(output_dir, relative)
+        return os.path.join(output_dir, os.path.basename(file_path))
+
+    @staticmethod
+    def isTempFile(name):
+        """ Indica si un nombre de archivo corresponde a un temporal creado por createTempFile. """
+        return name.startswith(FileProcessor.prefix_tmp) and name.endswith(FileProcessor.ext_tmp)
 
+    @staticmethod
+    def removeStaleTempFile(path, max_age=3600):
+        """ Borra un archivo temporal que dejó una ejecución interrumpida.
         Args:
-            unlocked_file (str): Path to the unlocked file.
-            original_path (str): Original path of the file.
+            path: Ruta del archivo temporal.
+            max_age: Antigüedad mínima en segundos, para no borrar los temporales de una ejecución en curso.
+        Returns:
+            True si el archivo se borró.
         """
-        logging.info(f"Copying and deleting files: {unlocked_file} to {original_path}")
         try:
-            old_path = os.path.dirname(unlocked_file)
-            original_path = original_path.replace("/", "\\")
-            logging.info(f"os.path.dirname(original_path): {os.path.dirname(original_path)}")
-            logging.info(f"os.path.basename(original_path): {os.path.basename(original_path)}")
-            # Path de destino = nombre de directorio original + nombre del archivo.xlsx
-            dst_path = os.path.dirname(original_path) + "\\" + os.path.basename(original_path)
-            logging.info(f"old_path: {old_path}")
-            logging.info(f"dst_path: {dst_path}")
-            shutil.copy2(unlocked_file, dst_path)
-            shutil.rmtree(old_path)
-        except Exception as e:
-            logging.error(f"Error copying and deleting files: {e}")
+            if os.path.getmtime(path) < time.time() - max_age:
+                os.remove(path)
+                logging.info(f"Removed stale temporary file {path}")
+                return True
+        except OSError as e:
+            logging.warning(f"Could not remove temporary file {path}: {e}")
+        return False
+
+    def getManifest(self, file):
+        """
+        Gets the sheets of a workbook from the metadata cache, parsing the workbook only the first time or when the
+        file changed. A workbook held in memory is parsed once and kept until another one is requested.
+
+        Args:
+            file (str | io.BytesIO): Path to the Excel file, or its content.
+
+        Returns:
+            WorkbookManifest: Sheets of the workbook.
+        """
+        if isinstance(file, str):
+            return self.manifest_cache.get(file)
+        if self._buffer_manifest[0] is not file:
+            self._buffer_manifest = (file, read_workbook_manifest(file))
+        return self._buffer_manifest[1]
 
     def sheetsLength(self, file):
         """
         Gets the number of sheets in an Excel file.
 
         Args:
-            file (str): Path to the Excel file.
+            file (str | io.BytesIO): Path to the Excel file, or its content.
 
         Returns:
             int: Number of sheets in the file.
         """
-        logging.info(f"Getting sheet length for file: {file}")
-        if not os.path.exists(file):
+        logging.debug("Getting sheet length for file: %s", file)
+        if isinstance(file, str) and not os.path.exists(file):
             logging.error(f"File does not exist: {file}")
             return 0
         try:
-            xl = pd.ExcelFile(file)
-            logging.info(f"xl.sheet_names:  {xl.sheet_names}")
-            npag = len(xl.sheet_names)
-            logging.info(f"npag:  {npag}")
+            manifest = self.getManifest(file)
+            logging.debug("sheet_names: %s", manifest.sheet_names)
+            npag = len(manifest)
+            logging.debug("npag: %s", npag)
             return npag
         except Exception as e:
             logging.error(f"Error reading Excel file: {e}")
@@ -187,52 +577,32 @@ class FileProcessor:
         Processes the input string to generate a list of sheet numbers.
 
         Args:
-            input_string (str): Input string containing sheet ranges.
+            input_string (str | SheetRange): Input string containing sheet ranges.
 
         Returns:
-            list: List of sheet numbers.
-        """
-        logging.info("Processing input string")
-        logging.info(f"input_string: {input_string}")
-        input_list = input_string.split(",")
-        processed_list = []
-        logging.info("antes del for process_string")
-        for i in input_list:
-            if "-" in i:
-                start, end = map(int, i.split("-"))
-                processed_list += [str(x) for x in range(start, end + 1)]
-            else:
-                if i.isdigit():
-                    processed_list.append(i)
-        processed_list = sorted(list(set(processed_list)))
-        processed_list = ",".join(processed_list)
-        processed_list = [int(x) for x in processed_list.split(",")]
-        processed_list.sort()
-        logging.info(f"processed_list: {processed_list}")
-        return processed_list
+            list: List of sheet numbers, sorted and without duplicates.
+        """
+        logging.debug("Processing input string: %s", input_string)
+        return list(parse_sheet_range(input_string))
 
     def rangeSheetsValidator(self, file_path, range_sheets):
         """
         Validates if the range of sheets is within the actual number of sheets in the file.
 
         Args:
-            file_path (str): Path to the file.
-            range_sheets (str): Range of sheets to be validated.
+            file_path (str | io.BytesIO): Path to the file, or its content.
+            range_sheets (str | SheetRange): Range of sheets to be validated.
 
         Returns:
             bool: True if the range is valid, False otherwise.
         """
-        logging.info("Validating range sheets")
+        logging.debug("Validating range sheets")
         npag = self.sheetsLength(file_path)
-        logging.info(f"npag: {npag}")
-        logging.info(f"Values: {range_sheets}")
-        output_values = self.process_string(range_sheets)
-        logging.info(f"output_values: {output_values}")
-        logging.info(f"output_values_type:  {type(output_values)}")
-        logging.info(f"Págs:  {output_values}")
-        last_page = int(output_values[-1])
-        logging.info(f"last_page:  {type(last_page)}")
-        logging.info(f"npag:  {type(npag)}")
+        last_page = parse_sheet_range(range_sheets).max
+        logging.debug("npag: %s, last_page: %s", npag, last_page)
+        if last_page is None:
+            logging.error("El intervalo de hojas está vacío.")
+            return False
         if last_page > npag:
             logging.error(
                 f"Alguna página ingresada excede la cantidad real de páginas del documento. Cant. Pág. del Doc: {npag}")
@@ -246,7 +616,9 @@ class FileProcessor:
         Returns:
             False si la entrada termina en '-' o en ',' y True si no.
         """
-        logging.info("Validating input range")
+        logging.debug("Validating input range")
+        if isinstance(range_sheets, SheetRange):
+            return True
         if range_sheets.endswith(",") or range_sheets.endswith("-"):
             logging.error("Se detectó una ',' o un '-' al final del intervalo de hojas. Borre para continuar.")
             return False
@@ -254,55 +626,87 @@ class FileProcessor:
 
     def inputFormatValidator(self, range_sheets):
         """ Verifica si la entrada del rango de páginas en caso de contener un valor con el formato:
-            n-m, n sea menor que m.
+            n-m, n sea menor que m, y que el resto de los valores sean números.
         Args:
             range_sheets: Entrada de texto. Ejemplo: 1,3,5-8
         Returns:
-            False si la entrada contiene un valor n-m, donde n > m. True si n < m.
-        """
-        logging.info("Validating input format")
-        valores = range_sheets.split(",")
-        for valor in valores:
-            if "-" in valor:
-                num1, num2 = map(int, valor.split("-"))
-                if num1 > num2:
-                    return False
+            False si la entrada contiene un valor n-m, donde n > m, o un valor que no es un número. True si no.
+        """
+        logging.debug("Validating input format")
+        try:
+            parse_sheet_range(range_sheets)
+        except ValueError as e:
+            logging.error(f"Formato de intervalo inválido: {e}")
+            return False
         return True
 
-    def modifySheets(self, zip_directory, range_sheets):
+    def sheetParts(self, file_path, range_sheets):
+        """
+        Resolves the sheets of a range to the archive members that hold them.
+
+        Args:
+            file_path (str | io.BytesIO): Path to the workbook, or its content.
+            range_sheets (str | SheetRange): Range of sheets.
+
+        Returns:
+            list: Member names, in range order.
+        """
+        manifest = self.getManifest(file_path)
+        parts = []
+        for sheet in parse_sheet_range(range_sheets):
+            entry = manifest.find(sheet)
+            if entry is None or entry.part is None:
+                logging.error(f"Sheet {sheet} not found in the workbook")
+                raise ValueError(f"Sheet {sheet} not found in the workbook")
+            parts.append(entry.part)
+        logging.debug("parts: %s", parts)
+        return parts
+
+    def isProtected(self, file_path, range_sheets, timings=None):
         """
-        Modifies the sheets in the extracted directory based on the specified range.
+        Checks whether any sheet of the range is protected, without rewriting anything. Scanning stops at the first
+        protected sheet, so a protected workbook costs a partial read of one sheet.
 
         Args:
-            zip_directory (str): Path to the extracted directory.
-            range_sheets (str): Range of sheets to be modified.
+            file_path (str | io.BytesIO): Path to the workbook, or its content.
+            range_sheets (str | SheetRange): Range of sheets to be checked.
+            timings (dict): If given, the seconds spent scanning are added to it under 'scan'.
+
+        Returns:
+            bool: True if at least one sheet of the range has a <sheetProtection> element.
+        """
+        start = time.perf_counter()
+        try:
+            with zipfile.ZipFile(file_path, "r") as zip_ref:
+                for part in self.sheetParts(file_path, range_sheets):
+                    with zip_ref.open(part) as stream:
+                        if has_sheet_protection(stream):
+                            return True
+            return False
+        finally:
+            if timings is not None:
+                timings["scan"] = timings.get("scan", 0.0) + time.perf_counter() - start
+
+    def modifySheets(self, source_path, target_path, range_sheets, timings=None):
+        """
+        Writes a copy of the workbook in which the sheets of the specified range are unlocked. The archive is
+        streamed member by member and only the worksheet parts of the range are rewritten.
+
+        Args:
+            source_path (str | file): Path to the original workbook, or a binary file object with it.
+            target_path (str | file): Path or binary file object where the unlocked workbook is written.
+            range_sheets (str | SheetRange): Range of sheets to be modified.
+            timings (dict): If given, the seconds spent in each stage of the rewrite are added to it.
+
+        Returns:
+            list: Names of the rewritten worksheet parts.
         """
-        logging.info(f"Modifying sheets in directory: {zip_directory}")
+        logging.debug("Modifying sheets in workbook: %s", source_path)
         try:
-            zip_directory_path = zip_directory + "/xl/worksheets"
-            sheets = self.process_string(range_sheets)
-            files = os.listdir(zip_directory_path)
-            xml_files = [file for file in files if file.endswith(".xml")]
-            logging.info(f"xml_files sheets: {xml_files}")
-            for sheet in sheets:
-                found = False
-                for nsheet in range(len(xml_files)):
-                    result = xml_files[nsheet].split('sheet')[1].split('.xml')[0]
-                    logging.info(f"Hoja n°: {result}")
-                    if result.isdigit() and int(result) == sheet:
-                        logging.info("coincide")
-                        mfile = xml_files[nsheet]
-                        logging.info(f"mfile: {mfile}")
-                        found = True
-                        break
-                if not found:
-                    logging.error(f"Sheet {sheet} not found in the directory")
-                    raise ValueError(f"Sheet {sheet} not found in the directory")
-                full_path = zip_directory_path + "/" + mfile
-                with open(full_path, "r") as f:
-                    content = f.read()
-                    content = content.replace('sheet="1"', 'sheet="0"')
-                with open(full_path, "w") as f:
-                    f.write(content)
+            parts = self.sheetParts(source_path, range_sheets)
+            return rewrite_archive(source_path, target_path, {part: SheetProtectionRemover for part in parts},
+                                   FileProcessor.compression_methods[self.compression], self.compresslevel, timings,
+                                   self.sheet_threads)
         except Exception as e:
-            logging.error(f"Error modifying sheets: {e}")
\ No newline at end of file
+            logging.error(f"Error modifying sheets: {e}")
+            raise
@@ -0,0 +1,367 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import logging
+import ctypes
+import ctypes.util
+from file_processor import FileProcessor
+from file_discovery import is_lock_file
+
+# inotify(7) event flags.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+# Longest wait between two checks of the stop conditions, so Ctrl+C is handled promptly.
+_MAX_WAIT = 1.0
+
+
+def is_candidate(path):
+    """
+    Tells whether a path looks like a workbook dropped by a user: an .xlsx file that is neither an Excel lock file
+    (~$name.xlsx) nor a temporary file of this tool.
+
+    Args:
+        path (str): Path to the file.
+
+    Returns:
+        bool: True if the file should be unlocked.
+    """
+    name = os.path.basename(path)
+    return (name.endswith(FileProcessor.ext_xlsx) and not is_lock_file(name)
+            and not FileProcessor.isTempFile(name))
+
+
+def file_signature(path):
+    """
+    Returns:
+        tuple: (size, mtime_ns) of the file, None if it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def scan_tree(directory, recursive=True):
+    """
+    Lists the candidate workbooks under a directory.
+
+    Yields:
+        str: Path of each workbook.
+    """
+    try:
+        entries = list(os.scandir(directory))
+    except OSError as e:
+        logging.warning(f"Could not list {directory}: {e}")
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if recursive:
+                yield from scan_tree(entry.path, recursive)
+        elif is_candidate(entry.path):
+            yield entry.path
+
+
+class InotifyBackend:
+    """
+    Change notifications from the Linux kernel through inotify(7), called with ctypes. Only the paths that changed
+    are reported, the tree is never rescanned except for directories that appear while watching. Directories that
+    appear once the watch limit is reached are polled instead.
+    """
+
+    def __init__(self, directory, recursive=True, poll_interval=5.0):
+        """
+        Args:
+            directory (str): Folder to watch.
+            recursive (bool): Also watches the subfolders, including the ones created later.
+            poll_interval (float): Seconds between listings of the subfolders that cannot be watched.
+
+        Raises:
+            OSError: If inotify is not available or the watches cannot be added, e.g. the watch limit is reached.
+        """
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directory = directory
+        self.recursive = recursive
+        self.poll_interval = poll_interval
+        self._watches = {}
+        self._pollers = []
+        try:
+            self._addTree(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def _addWatch(self, directory):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_add_watch failed for {directory}: {os.strerror(error)}")
+        self._watches[wd] = directory
+
+    def _addTree(self, directory):
+        self._addWatch(directory)
+        if self.recursive:
+            for root, directories, _ in os.walk(directory):
+                for name in directories:
+                    try:
+                        self._addWatch(os.path.join(root, name))
+                    except FileNotFoundError:
+                        # Removed while walking, there is nothing left to watch.
+                        continue
+
+    def _addNewTree(self, path):
+        """
+        Watches a directory that appeared while watching. Errors are logged rather than raised, so folder churn
+        does not stop the watch.
+
+        Returns:
+            list: Paths of the workbooks already in the directory.
+        """
+        try:
+            self._addTree(path)
+        except FileNotFoundError:
+            logging.info(f"{path} was removed before it could be watched")
+            return []
+        except OSError as e:
+            # Usually ENOSPC, the watch limit (fs.inotify.max_user_watches) is reached.
+            logging.warning(f"Could not watch {path} ({e}), polling it every {self.poll_interval} s instead")
+            self._pollers.append(PollingBackend(path, self.recursive, self.poll_interval))
+        # Files may have landed before the watch was added, so the new directory is scanned once.
+        return list(scan_tree(path, self.recursive))
+
+    def _polledChanges(self):
+        paths = []
+        for poller in list(self._pollers):
+            if not os.path.isdir(poller.directory):
+                self._pollers.remove(poller)
+                continue
+            paths.extend(poller.changes(0))
+        return paths
+
+    def changes(self, timeout):
+        """
+        Waits up to timeout seconds for changes.
+
+        Returns:
+            list: Paths of the files that were written, moved in or created.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        paths = self._polledChanges()
+        if not readable:
+            return paths
+        try:
+            data = os.read(self.fd, _READ_SIZE)
+        except BlockingIOError:
+            return paths
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, a single scan finds whatever was missed.
+                logging.warning("inotify queue overflow, scanning the whole tree once")
+                paths.extend(scan_tree(self.directory, self.recursive))
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    paths.extend(self._addNewTree(path))
+                continue
+            paths.append(path)
+        return paths
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingBackend:
+    """
+    Fallback for platforms and file systems without inotify (e.g. network mounts written by other hosts): the tree
+    is listed every interval seconds and compared with the previous listing.
+    """
+
+    def __init__(self, directory, recursive=True, interval=5.0):
+        self.directory = directory
+        self.recursive = recursive
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + interval
+
+    def _scan(self):
+        return {path: file_signature(path) for path in scan_tree(self.directory, self.recursive)}
+
+    def changes(self, timeout):
+        """
+        Waits up to timeout seconds, or until the next listing is due.
+
+        Returns:
+            list: Paths of the files that are new or changed since the previous listing.
+        """
+        wait = self._next_scan - time.monotonic()
+        if timeout is not None and timeout < wait:
+            time.sleep(max(0.0, timeout))
+            return []
+        time.sleep(max(0.0, wait))
+        self._next_scan = time.monotonic() + self.interval
+        snapshot = self._scan()
+        changed = [path for path, signature in snapshot.items() if self._snapshot.get(path) != signature]
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    """
+    Watches a folder and groups the workbooks that land in it into batches. A file is only reported once its size
+    and mtime stayed the same for settle seconds, so copies in progress are not picked up half written, and the
+    files that settle within batch_window seconds of each other are reported together.
+    """
+
+    def __init__(self, directory, recursive=True, settle=2.0, batch_window=1.0, max_batch=500, poll=False,
+                 poll_interval=5.0):
+        """
+        Args:
+            directory (str): Folder to watch.
+            recursive (bool): Also watches the subfolders, including the ones created later.
+            settle (float): Seconds a file must stay unchanged before it is reported.
+            batch_window (float): Seconds to wait for more files once one is ready.
+            max_batch (int): Files after which a batch is reported without waiting.
+            poll (bool): Uses the polling backend even if inotify is available.
+            poll_interval (float): Seconds between listings of the polling backend.
+        """
+        self.directory = directory
+        self.settle = settle
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._ignored = {}
+        self.backend = None
+        if not poll:
+            try:
+                self.backend = InotifyBackend(directory, recursive, poll_interval)
+            except OSError as e:
+                logging.warning(f"inotify not available ({e}), polling every {poll_interval} s instead")
+        if self.backend is None:
+            self.backend = PollingBackend(directory, recursive, poll_interval)
+        self.recursive = recursive
+
+    def ignore(self, path):
+        """
+        Ignores the next change of a file if it leaves the file as it is now, so the workbooks written by the
+        unlocker itself are not picked up again.
+
+        Args:
+            path (str): Path of a file that was just written.
+        """
+        signature = file_signature(path)
+        if signature is not None:
+            self._ignored[path] = signature
+
+    def contains(self, path):
+        """ Tells whether a path is inside the watched folder. """
+        root = os.path.abspath(self.directory)
+        return os.path.abspath(path).startswith(root + os.sep) and (self.recursive or os.path.dirname(
+            os.path.abspath(path)) == root)
+
+    def batches(self, initial_scan=False):
+        """
+        Watches the folder for ever.
+
+        Args:
+            initial_scan (bool): Also reports the workbooks that are already in the folder.
+
+        Yields:
+            list: Paths of the workbooks that settled, in arrival order.
+        """
+        pending = {}
+        ready = []
+        last_ready = 0.0
+        if initial_scan:
+            now = time.monotonic()
+            for path in scan_tree(self.directory, self.recursive):
+                pending[path] = (now - self.settle, file_signature(path))
+        while True:
+            now = time.monotonic()
+            deadlines = [changed + self.settle for changed, _ in pending.values()]
+            if ready:
+                deadlines.append(last_ready + self.batch_window)
+            timeout = min([_MAX_WAIT] + [max(0.0, deadline - now) for deadline in deadlines])
+            for path in self.backend.changes(timeout):
+                if is_candidate(path):
+                    pending[path] = (time.monotonic(), file_signature(path))
+            now = time.monotonic()
+            for path, (changed, signature) in list(pending.items()):
+                if now - changed < self.settle:
+                    continue
+                current = file_signature(path)
+                if current is None:
+                    del pending[path]
+                elif current != signature:
+                    # Still being written.
+                    pending[path] = (now, current)
+                else:
+                    del pending[path]
+                    if self._ignored.pop(path, None) == current:
+                        continue
+                    ready.append(path)
+                    last_ready = now
+            if ready and (len(ready) >= self.max_batch or now - last_ready >= self.batch_window):
+                logging.info(f"{len(ready)} files ready")
+                yield ready
+                ready = []
+
+    def close(self):
+        self.backend.close()
+
+
+def watch(watcher, batch_processor, range_sheets=None, output_path_for=None, initial_scan=False):
+    """
+    Unlocks the workbooks of a watched folder as they arrive, one BatchProcessor run per batch.
+
+    Args:
+        watcher (FolderWatcher): Source of the batches.
+        batch_processor (BatchProcessor): Engine used to unlock each batch. Create it with keep_pool=True so its
+            worker processes are reused from one batch to the next.
+        range_sheets (str): Range of sheets to be unlocked in every file. None or "" unlocks all the sheets.
+        output_path_for (callable): Maps each file to the path of its unlocked copy. None replaces the originals.
+        initial_scan (bool): Also unlocks the workbooks that are already in the folder.
+
+    Yields:
+        dict: Result of each file, see BatchProcessor.makeResult.
+    """
+    for batch in watcher.batches(initial_scan):
+        for result in batch_processor.run(batch, range_sheets, output_path_for):
+            written = result.get("output_path", result["file"])
+            # Skipped workbooks are only written when they are copied to another destination.
+            wrote = not result.get("skipped") or "output_path" in result
+            if result["ok"] and wrote and watcher.contains(written):
+                watcher.ignore(written)
+            yield result
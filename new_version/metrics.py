@@ -0,0 +1,130 @@
+import os
+import json
+import threading
+
+# Stages of the unlock pipeline, in order.
+STAGES = ("read", "hash", "validate", "scan", "open", "rewrite_sheets", "write_archive", "commit")
+
+
+class UnlockMetrics:
+    """
+    Aggregates the reports of unlocked files (FileProcessor.last_report) into per-stage timings and counters.
+    Reports can come from the same process or from the workers of a BatchProcessor, so the totals are kept in the
+    process that records them.
+    """
+
+    def __init__(self, sinks=None):
+        """
+        Args:
+            sinks (list): Objects with a write(report) method that receive every recorded report, e.g. JsonLinesSink.
+        """
+        self.sinks = list(sinks or [])
+        self._lock = threading.Lock()
+        self.files = 0
+        self.files_failed = 0
+        self.files_skipped = 0
+        self.files_cached = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.sheets_touched = 0
+        self.seconds = 0.0
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+
+    def record(self, report):
+        """
+        Adds the report of one file to the totals and passes it to the sinks.
+
+        Args:
+            report (dict): FileProcessor.last_report, or a BatchProcessor result.
+        """
+        with self._lock:
+            self.files += 1
+            if not report.get("ok"):
+                self.files_failed += 1
+            elif report.get("skipped"):
+                self.files_skipped += 1
+            if report.get("cached"):
+                self.files_cached += 1
+            self.bytes_in += report.get("input_bytes", 0)
+            self.bytes_out += report.get("output_bytes", 0)
+            self.sheets_touched += report.get("sheets_touched", 0)
+            self.seconds += report.get("seconds", 0.0)
+            for stage, seconds in report.get("stages", {}).items():
+                self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+            for sink in self.sinks:
+                sink.write(report)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Current totals.
+        """
+        with self._lock:
+            return {
+                "files": self.files,
+                "files_failed": self.files_failed,
+                "files_skipped": self.files_skipped,
+                "files_cached": self.files_cached,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "sheets_touched": self.sheets_touched,
+                "seconds": self.seconds,
+                "stage_seconds": dict(self.stage_seconds),
+            }
+
+    def write_prometheus(self, path):
+        """
+        Writes the totals in the Prometheus text format, for the node_exporter textfile collector. The file is
+        replaced atomically so the collector never reads it half-written.
+
+        Args:
+            path (str): Destination file, usually ending in .prom.
+        """
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP excel_breaker_files_total Workbooks processed.",
+            "# TYPE excel_breaker_files_total counter",
+            f'excel_breaker_files_total{{result="ok"}} '
+            f'{snapshot["files"] - snapshot["files_failed"] - snapshot["files_skipped"]}',
+            f'excel_breaker_files_total{{result="skipped"}} {snapshot["files_skipped"]}',
+            f'excel_breaker_files_total{{result="failed"}} {snapshot["files_failed"]}',
+            "# HELP excel_breaker_cache_hits_total Workbooks finished from the result cache.",
+            "# TYPE excel_breaker_cache_hits_total counter",
+            f'excel_breaker_cache_hits_total {snapshot["files_cached"]}',
+            "# HELP excel_breaker_bytes_total Bytes read and written.",
+            "# TYPE excel_breaker_bytes_total counter",
+            f'excel_breaker_bytes_total{{direction="in"}} {snapshot["bytes_in"]}',
+            f'excel_breaker_bytes_total{{direction="out"}} {snapshot["bytes_out"]}',
+            "# HELP excel_breaker_sheets_touched_total Worksheet parts rewritten.",
+            "# TYPE excel_breaker_sheets_touched_total counter",
+            f'excel_breaker_sheets_touched_total {snapshot["sheets_touched"]}',
+            "# HELP excel_breaker_stage_seconds_total Time spent in each stage of the pipeline.",
+            "# TYPE excel_breaker_stage_seconds_total counter",
+        ]
+        lines += [f'excel_breaker_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}'
+                  for stage, seconds in snapshot["stage_seconds"].items()]
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+
+
+class JsonLinesSink:
+    """
+    Appends every report to a file, one JSON object per line.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Destination file, it is created if it does not exist.
+        """
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, report):
+        self._file.write(json.dumps(report, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,255 @@
+import io
+import os
+import time
+import queue
+import logging
+import threading
+from file_processor import FileProcessor
+
+# Default bytes of workbooks held in memory between the read and the write stages.
+DEFAULT_MEMORY_CAP = 256 * 1024 * 1024
+
+# Marks the end of the stream in the queues between stages.
+_END = object()
+
+
+class MemoryBudget:
+    """
+    Bounds the bytes held in memory by the pipeline: the workbooks read and the unlocked copies waiting to be
+    written. A file larger than the whole budget is still let through when nothing else is held, so it never blocks
+    forever.
+
+    Unlocked copies only wait for other copies being written, not for the workbooks read ahead, which can only be
+    released by the threads that would be waiting. So when no copy is being written, one can go past the cap, and
+    the readers then wait until the written copies bring the total back under it.
+    """
+
+    def __init__(self, capacity):
+        """
+        Args:
+            capacity (int): Bytes that can be held at the same time.
+        """
+        self.capacity = capacity
+        self.used = 0
+        self.writing = 0
+        self.stopped = False
+        self._condition = threading.Condition()
+
+    def acquire(self, size, output=False):
+        """
+        Waits until size bytes fit in the budget.
+
+        Args:
+            size (int): Bytes to be reserved.
+            output (bool): The bytes are an unlocked copy waiting to be written, see the class description.
+
+        Returns:
+            bool: True if the bytes were reserved, False if the budget was stopped while waiting.
+        """
+        with self._condition:
+            while (not self.stopped and (self.writing if output else self.used)
+                   and self.used + size > self.capacity):
+                self._condition.wait()
+            if self.stopped:
+                return False
+            self.used += size
+            if output:
+                self.writing += size
+            return True
+
+    def release(self, size, output=False):
+        with self._condition:
+            self.used -= size
+            if output:
+                self.writing -= size
+            self._condition.notify_all()
+
+    def stop(self):
+        """ Wakes up every waiting acquire, which then fails. """
+        with self._condition:
+            self.stopped = True
+            self._condition.notify_all()
+
+
+class UnlockPipeline:
+    """
+    Unlocks files in three overlapped stages connected by bounded queues, all in the calling process: reader
+    threads prefetch the next workbooks into memory, transform threads unlock them in memory, and writer threads
+    commit the results behind. On high-latency network shares the reads and writes of some files happen while
+    others are being transformed, instead of the CPU waiting for the link and the link for the CPU.
+    """
+
+    def __init__(self, compression=FileProcessor.compression_keep, compresslevel=None, skip_unprotected=True,
+                 transform_threads=1, read_ahead=4, write_behind=4, memory_cap=DEFAULT_MEMORY_CAP, io_threads=2,
+                 sheet_threads=1, result_cache=None, hash_results=False):
+        """
+        Args:
+            compression (str): Compression policy passed to FileProcessor.
+            compresslevel (int): Compression level passed to FileProcessor.
+            skip_unprotected (bool): Leaves the files without protected sheets untouched, see FileProcessor.
+            transform_threads (int): Threads unlocking workbooks. zlib releases the GIL, so more than one helps
+                when the members are compressed again.
+            read_ahead (int): Workbooks read and waiting to be transformed.
+            write_behind (int): Unlocked workbooks waiting to be written.
+            memory_cap (int): Bytes held in memory at the same time by the workbooks read and the unlocked copies
+                waiting to be written, see MemoryBudget.
+            io_threads (int): Reader threads, and also writer threads.
+            sheet_threads (int): Threads rewriting the sheets of each workbook, see FileProcessor.
+            result_cache (ResultCache): Cache of unlocked workbooks by content, see FileProcessor.
+            hash_results (bool): Hashes each file as it is left on disk, see FileProcessor.
+        """
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self.skip_unprotected = skip_unprotected
+        self.transform_threads = max(1, transform_threads)
+        self.read_ahead = max(1, read_ahead)
+        self.write_behind = max(1, write_behind)
+        self.memory_cap = memory_cap
+        self.io_threads = max(1, io_threads)
+        self.sheet_threads = sheet_threads
+        self.result_cache = result_cache
+        self.hash_results = hash_results
+
+    def run(self, files, range_sheets=None, output_path_for=None):
+        """
+        Unlocks the files and yields the outcome of each one as soon as it is committed, not in input order. Closing
+        the generator stops reading new files, finishes the ones being transformed and writes the pending results.
+
+        Args:
+            files (iterable): Paths of the files to be unlocked, it is consumed by the reader threads.
+            range_sheets (str | SheetRange): Range of sheets to be unlocked in every file.
+            output_path_for (callable): Maps each file to the path of its unlocked copy. None replaces the originals.
+
+        Yields:
+            tuple: (file_path, unlocked_sheets, message, report) of each file.
+        """
+        files = iter(files)
+        output_path_for = output_path_for or (lambda file_path: None)
+        budget = MemoryBudget(self.memory_cap)
+        stop = threading.Event()
+        files_lock = threading.Lock()
+        read_queue = queue.Queue(self.read_ahead)
+        write_queue = queue.Queue(self.write_behind)
+        results = queue.Queue()
+        remaining = {"readers": self.io_threads, "transformers": self.transform_threads, "writers": self.io_threads}
+        remaining_lock = threading.Lock()
+
+        def finish(stage, next_queue, count):
+            # The last thread of a stage tells every thread of the next stage that the stream ended.
+            with remaining_lock:
+                remaining[stage] -= 1
+                last = remaining[stage] == 0
+            if last:
+                for _ in range(count):
+                    next_queue.put(_END)
+
+        def read():
+            try:
+                while not stop.is_set():
+                    with files_lock:
+                        file_path = next(files, None)
+                    if file_path is None:
+                        break
+                    start = time.perf_counter()
+                    try:
+                        size = os.path.getsize(file_path)
+                        if not budget.acquire(size):
+                            break
+                        try:
+                            with open(file_path, "rb") as f:
+                                workbook = io.BytesIO(f.read())
+                        except BaseException:
+                            budget.release(size)
+                            raise
+                    except OSError as e:
+                        results.put(self._failed(file_path, e))
+                        continue
+                    read_queue.put((file_path, workbook, size, time.perf_counter() - start))
+            except Exception as e:
+                # The iterable of files failed, e.g. a generator walking a directory that vanished.
+                results.put(e)
+            finally:
+                finish("readers", read_queue, self.transform_threads)
+
+        def transform():
+            processor = FileProcessor(self.compression, self.compresslevel, skip_unprotected=self.skip_unprotected,
+                                      sheet_threads=self.sheet_threads, result_cache=self.result_cache,
+                                      hash_results=self.hash_results)
+            try:
+                while True:
+                    item = read_queue.get()
+                    if item is _END:
+                        break
+                    file_path, workbook, size, read_seconds = item
+                    if stop.is_set():
+                        budget.release(size)
+                        continue
+                    pending_write = []
+                    unlocked_sheets, msg = processor.process_single_file(
+                        file_path, range_sheets, output_path_for(file_path), workbook,
+                        lambda unlocked, destination: pending_write.append((unlocked, destination)))
+                    report = processor.last_report
+                    report["stages"]["read"] = read_seconds
+                    del workbook
+                    # The original is no longer needed, its bytes go back to the budget before the copy takes some.
+                    budget.release(size)
+                    if pending_write:
+                        unlocked, destination = pending_write[0]
+                        unlocked_size = unlocked.getbuffer().nbytes
+                        if budget.acquire(unlocked_size, output=True):
+                            write_queue.put((file_path, unlocked, destination, unlocked_size, unlocked_sheets, msg,
+                                             report))
+                            continue
+                        unlocked_sheets, msg = [], f"Error al desbloquear el archivo {file_path}: cancelado."
+                        report["ok"] = False
+                    results.put((file_path, unlocked_sheets, msg, report))
+            finally:
+                finish("transformers", write_queue, self.io_threads)
+
+        def write():
+            processor = FileProcessor(self.compression, self.compresslevel)
+            try:
+                while True:
+                    item = write_queue.get()
+                    if item is _END:
+                        break
+                    file_path, unlocked, destination, unlocked_size, unlocked_sheets, msg, report = item
+                    try:
+                        processor.writeFile(unlocked, destination, file_path, report["stages"])
+                    except Exception as e:
+                        unlocked_sheets, msg = [], f"Error al desbloquear el archivo {file_path}: {e}"
+                        logging.error(msg)
+                        report["ok"] = False
+                    finally:
+                        del unlocked
+                        budget.release(unlocked_size, output=True)
+                    results.put((file_path, unlocked_sheets, msg, report))
+            finally:
+                finish("writers", results, 1)
+
+        threads = ([threading.Thread(target=read, name=f"unlock-read-{i}") for i in range(self.io_threads)]
+                   + [threading.Thread(target=transform, name=f"unlock-transform-{i}")
+                      for i in range(self.transform_threads)]
+                   + [threading.Thread(target=write, name=f"unlock-write-{i}") for i in range(self.io_threads)])
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            while True:
+                item = results.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            budget.stop()
+            for thread in threads:
+                thread.join()
+
+    @staticmethod
+    def _failed(file_path, error):
+        msg = f"Error al desbloquear el archivo {file_path}: {error}"
+        logging.error(msg)
+        return file_path, [], msg, {"file": file_path, "ok": False}
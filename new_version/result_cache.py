@@ -0,0 +1,206 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+
+# Default size of the cache on disk.
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# After an eviction the cache is left at this fraction of its size, so evictions do not run on every insert.
+EVICTION_TARGET = 0.9
+_META_SUFFIX = ".json"
+_DATA_SUFFIX = ".xlsx"
+
+
+def file_digest(path):
+    """
+    Args:
+        path (str): Path to the file.
+
+    Returns:
+        str: SHA-256 of the file content, in hexadecimal.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of unlocked workbooks on local disk. Entries are keyed by the hash of the original
+    workbook plus the options that change the output, so a byte-identical copy found anywhere else costs a hash and
+    a copy. Least recently used entries are evicted when the cache grows past max_bytes. Several processes can share
+    the same directory: entries are written with an atomic rename and a missing entry is just a miss.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            directory (str): Cache directory, it is created if it does not exist.
+            max_bytes (int): Size of the cache on disk after which the least recently used entries are evicted.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Estimated size of the cache, computed on the first insert and kept up to date by this process only.
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def __reduce__(self):
+        # Worker processes get their own instance on the same directory.
+        return ResultCache, (self.directory, self.max_bytes)
+
+    @staticmethod
+    def key(digest, range_sheets, compression, compresslevel, skip_unprotected=True):
+        """
+        Builds the key of an entry.
+
+        Args:
+            digest (str): SHA-256 of the original workbook.
+            range_sheets (str): Canonical sheet range, "" for all the sheets.
+            compression (str): Compression policy.
+            compresslevel (int): Compression level.
+            skip_unprotected (bool): Whether workbooks without protected sheets are left untouched. A workbook
+                cached as skipped must still be rewritten when this is off.
+
+        Returns:
+            str: Key of the entry, in hexadecimal.
+        """
+        return hashlib.sha256(
+            f"{digest}|{range_sheets}|{compression}|{compresslevel}|{bool(skip_unprotected)}".encode()).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key[:2], key)
+        return base + _META_SUFFIX, base + _DATA_SUFFIX
+
+    def get(self, key):
+        """
+        Looks up an entry and marks it as recently used.
+
+        Args:
+            key (str): Key of the entry, see key.
+
+        Returns:
+            dict: Metadata stored with put, plus 'path' with the cached workbook (None if the original was left
+                unchanged). None if the key is not cached.
+        """
+        meta_path, data_path = self._paths(key)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                entry = json.load(f)
+            entry["path"] = None
+            if not entry.get("skipped"):
+                os.utime(data_path)
+                entry["path"] = data_path
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry, unlocked=None):
+        """
+        Stores an entry. Errors are logged and ignored, the cache is only an optimisation.
+
+        Args:
+            key (str): Key of the entry, see key.
+            entry (dict): JSON serialisable metadata of the result.
+            unlocked (str | io.BytesIO): Path or content of the unlocked workbook, None if nothing was written.
+        """
+        meta_path, data_path = self._paths(key)
+        directory = os.path.dirname(meta_path)
+        added = 0
+        try:
+            os.makedirs(directory, exist_ok=True)
+            if unlocked is not None:
+                added += self._writeAtomic(directory, data_path, unlocked)
+            added += self._writeAtomic(directory, meta_path, json.dumps(entry).encode())
+        except OSError as e:
+            logging.warning(f"Could not store the result in the cache: {e}")
+            return
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += added
+        if self._size > self.max_bytes:
+            self._evict()
+
+    @staticmethod
+    def _writeAtomic(directory, path, content):
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(content, str):
+                    with open(content, "rb") as source:
+                        shutil.copyfileobj(source, f, 1024 * 1024)
+                elif isinstance(content, bytes):
+                    f.write(content)
+                else:
+                    f.write(content.getbuffer())
+                size = f.tell()
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return size
+
+    def _entries(self):
+        """ Yields (last use, size, key) of every entry on disk. """
+        for bucket in os.scandir(self.directory):
+            if not bucket.is_dir():
+                continue
+            sizes = {}
+            for item in os.scandir(bucket.path):
+                key, suffix = os.path.splitext(item.name)
+                if suffix not in (_META_SUFFIX, _DATA_SUFFIX):
+                    continue
+                try:
+                    stat = item.stat()
+                except OSError:
+                    continue
+                used, size = sizes.get(key, (0, 0))
+                sizes[key] = (max(used, stat.st_mtime), size + stat.st_size)
+            for key, (used, size) in sizes.items():
+                yield used, size, key
+
+    def size(self):
+        """
+        Returns:
+            int: Bytes used by the entries on disk.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """ Removes the least recently used entries until the cache is back under EVICTION_TARGET of its size. """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICTION_TARGET
+        for _, size, key in entries:
+            if total <= target:
+                break
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logging.warning(f"Could not evict {path} from the cache: {e}")
+            total -= size
+            logging.debug("Evicted cache entry %s", key)
+        self._size = total
+
+    def clear(self):
+        """ Removes every entry. """
+        for _, _, key in list(self._entries()):
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        self._size = 0
@@ -0,0 +1,179 @@
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from result_cache import file_digest
+from sheet_ranges import parse_sheet_range
+
+# Results written between two commits of the journal.
+COMMIT_EVERY = 100
+# Outcomes after which an unchanged file does not need to be processed again.
+DONE_STATUSES = ("ok", "skipped")
+
+
+class RunJournal:
+    """
+    SQLite journal of the files processed by batch runs. It records each file's path, size, mtime, content hash,
+    outcome and a digest of the run options, so a later run over the same tree only processes new, changed or
+    previously failed files, or files processed with other sheets, destination or compression. An interrupted run
+    resumes where it stopped, and an unchanged file costs a single stat.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Database file, it is created if it does not exist.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.unchanged = 0
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        # The journal is created in one thread and used by the batch worker thread in the GUI.
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " sha256 TEXT,"
+            " status TEXT NOT NULL,"
+            " message TEXT,"
+            " updated_at REAL NOT NULL,"
+            " options TEXT)")
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(files)")]
+        if "options" not in columns:
+            # Journals written before the options were recorded: their files are processed once more.
+            self._connection.execute("ALTER TABLE files ADD COLUMN options TEXT")
+        self._connection.commit()
+
+    @staticmethod
+    def optionsDigest(range_sheets, output_path, compression, compresslevel, skip_unprotected):
+        """
+        Digest of the options that change what a run writes for a file.
+
+        Args:
+            range_sheets (str | SheetRange): Range of sheets to be unlocked. None or "" for all the sheets.
+            output_path (str): Where the unlocked workbook is written.
+            compression (str): Compression policy.
+            compresslevel (int): Compression level.
+            skip_unprotected (bool): Whether workbooks without protected sheets are left untouched.
+
+        Returns:
+            str: SHA-256 of the options, in hexadecimal.
+        """
+        try:
+            spec = "" if range_sheets is None or range_sheets == "" else str(parse_sheet_range(range_sheets))
+        except ValueError:
+            spec = str(range_sheets)
+        options = f"{spec}|{os.path.abspath(output_path)}|{compression}|{compresslevel}|{bool(skip_unprotected)}"
+        return hashlib.sha256(options.encode()).hexdigest()
+
+    @staticmethod
+    def hashFile(path):
+        """
+        Args:
+            path (str): Path to the file.
+
+        Returns:
+            str: SHA-256 of the file content, in hexadecimal.
+        """
+        return file_digest(path)
+
+    def needsProcessing(self, path, options=None):
+        """
+        Tells whether a file is new, changed, failed last time or was processed with other options. A file with the
+        same size and mtime as recorded is taken as unchanged; if only the mtime changed, the content hash decides.
+
+        Args:
+            path (str): Path to the file.
+            options (str): Digest of the options of this run, see optionsDigest.
+
+        Returns:
+            bool: True if the file has to be processed.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return True
+        key = os.path.abspath(path)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT size, mtime_ns, sha256, status, options FROM files WHERE path = ?", (key,)).fetchone()
+        if row is None or row[3] not in DONE_STATUSES or row[0] != stat.st_size or row[4] != options:
+            return True
+        if row[1] == stat.st_mtime_ns:
+            return False
+        # Same size but touched (e.g. copied back): only the content tells if it changed.
+        if row[2] is not None and row[2] == self.hashFile(path):
+            with self._lock:
+                self._connection.execute("UPDATE files SET mtime_ns = ? WHERE path = ?", (stat.st_mtime_ns, key))
+                self._commitLater()
+            return False
+        return True
+
+    def pending(self, files, options_for=None):
+        """
+        Filters an iterable of files down to the ones that need processing.
+
+        Args:
+            files (iterable): Paths of the candidate files.
+            options_for (callable): Maps each file to the digest of its options, see optionsDigest.
+
+        Yields:
+            str: Paths of the new, changed or failed files.
+        """
+        for file_path in files:
+            if self.needsProcessing(file_path, options_for(file_path) if options_for is not None else None):
+                yield file_path
+            else:
+                self.unchanged += 1
+                logging.debug("Unchanged since the last run: %s", file_path)
+
+    def record(self, result, options=None):
+        """
+        Stores the outcome of a file. For the files that were unlocked or skipped, the size, mtime and hash of the
+        file as it is now on disk are stored, so the next run with the same options recognises it as done. The hash
+        is taken from the result, where the worker that processed the file computed it, so the file is not read
+        again here.
+
+        Args:
+            result (dict): Result of the file, see BatchProcessor.makeResult. Its 'sha256' key is set when the
+                processor had hash_results on.
+            options (str): Digest of the options of the run, see optionsDigest.
+        """
+        path = result["file"]
+        status = "failed" if not result["ok"] else "skipped" if result.get("skipped") else "ok"
+        size, mtime_ns, sha256 = -1, -1, None
+        if status != "failed":
+            try:
+                stat = os.stat(path)
+                size, mtime_ns = stat.st_size, stat.st_mtime_ns
+                sha256 = result.get("sha256")
+            except OSError as e:
+                logging.warning(f"Could not record {path} in the journal: {e}")
+                status = "failed"
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256, status, message, updated_at, options)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (os.path.abspath(path), size, mtime_ns, sha256, status, result.get("message"), time.time(), options))
+            self._commitLater()
+
+    def _commitLater(self):
+        """ Commits every COMMIT_EVERY changes, a crash loses at most those results. Called with the lock held. """
+        self._uncommitted += 1
+        if self._uncommitted >= COMMIT_EVERY:
+            self._connection.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        """ Commits the pending changes and closes the database. """
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
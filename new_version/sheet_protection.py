@@ -0,0 +1,119 @@
+import re
+
+# Start of the protection element, with or without a namespace prefix (e.g. <x:sheetProtection).
+_ELEMENT_START = re.compile(rb"<(?:[A-Za-z_][\w.-]*:)?sheetProtection[\s/>]")
+# Whole start tag, skipping '>' characters inside quoted attribute values.
+_START_TAG = re.compile(rb"<[^>\"']*(?:(?:\"[^\"]*\"|'[^']*')[^>\"']*)*>")
+_ELEMENT_END = re.compile(rb"</(?:[A-Za-z_][\w.-]*:)?sheetProtection\s*>")
+
+# Tail of each chunk held back in case the element start is split between two chunks.
+_LOOKBEHIND = 64
+# Upper bound for the protection element, it only holds attributes.
+MAX_ELEMENT_SIZE = 64 * 1024
+# Block size used when scanning a worksheet for the protection element.
+SCAN_CHUNK_SIZE = 256 * 1024
+
+
+class SheetProtectionRemover:
+    """
+    Removes the <sheetProtection> element from a worksheet XML stream, chunk by chunk. Works on the raw bytes, so
+    there is no decode/encode round-trip, and memory stays bounded by the chunk size whatever the size of the sheet.
+
+    Usage:
+        remover = SheetProtectionRemover()
+        for chunk in chunks:
+            output.write(remover.feed(chunk))
+        output.write(remover.flush())
+    """
+
+    def __init__(self):
+        self.removed = False
+        self._pending = b""
+        self._inside = False
+
+    def feed(self, chunk):
+        """
+        Processes the next chunk of the worksheet.
+
+        Args:
+            chunk (bytes): Next bytes of the worksheet XML.
+
+        Returns:
+            bytes: Output that is ready to be written, it can be shorter or longer than the chunk.
+        """
+        if self.removed:
+            return chunk
+        data = self._pending + chunk
+        output = b""
+        if not self._inside:
+            match = _ELEMENT_START.search(data)
+            if match is None:
+                keep = min(len(data), _LOOKBEHIND)
+                self._pending = data[len(data) - keep:]
+                return data[:len(data) - keep]
+            output = data[:match.start()]
+            data = data[match.start():]
+            self._inside = True
+        end = self._elementEnd(data)
+        if end is None:
+            if len(data) > MAX_ELEMENT_SIZE:
+                raise ValueError("Unterminated sheetProtection element")
+            self._pending = data
+            return output
+        self._pending = b""
+        self._inside = False
+        self.removed = True
+        return output + data[end:]
+
+    def flush(self):
+        """
+        Returns the bytes held back once the whole worksheet has been fed.
+
+        Returns:
+            bytes: Remaining output.
+        """
+        if self._inside:
+            raise ValueError("Unterminated sheetProtection element")
+        pending, self._pending = self._pending, b""
+        return pending
+
+    @staticmethod
+    def _elementEnd(data):
+        """
+        Finds where the protection element that starts at data[0] ends.
+
+        Returns:
+            int: Offset just past the element, or None if more data is needed.
+        """
+        tag = _START_TAG.match(data)
+        if tag is None:
+            return None
+        if tag.group().endswith(b"/>"):
+            return tag.end()
+        closing = _ELEMENT_END.search(data, tag.end())
+        return closing.end() if closing is not None else None
+
+
+
+def has_sheet_protection(stream):
+    """
+    Tells whether a worksheet XML stream contains a <sheetProtection> element. Reading stops as soon as the element
+    is found. The element comes after <sheetData> in the schema, so an unprotected sheet is read to the end, but
+    nothing is decoded or kept in memory besides the current chunk.
+
+    Args:
+        stream (file): Binary stream of the decompressed worksheet, e.g. ZipFile.open(part).
+
+    Returns:
+        bool: True if the worksheet is protected.
+    """
+    tail = b""
+    while True:
+        chunk = stream.read(SCAN_CHUNK_SIZE)
+        if not chunk:
+            return False
+        data = tail + chunk
+        # bytes.find is much faster than the regular expression, which only confirms the candidates.
+        if data.find(b"sheetProtection") != -1 and _ELEMENT_START.search(data):
+            return True
+        tail = data[-_LOOKBEHIND:]
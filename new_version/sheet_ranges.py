@@ -0,0 +1,133 @@
+import functools
+from bisect import bisect_right
+
+# Distinct range specs kept parsed in each process.
+PARSE_CACHE_SIZE = 256
+
+
+class SheetRange:
+    """
+    Immutable set of sheet numbers kept as sorted, merged, inclusive intervals. A spec like 1-1000000 is a single
+    interval, so memory depends on the number of intervals and not on the number of sheets. Membership is a
+    binary search over the interval starts.
+    """
+    __slots__ = ("_starts", "_ends", "_count")
+
+    def __init__(self, intervals=()):
+        """
+        Args:
+            intervals (iterable): (start, end) pairs, inclusive, in any order. Overlapping and adjacent intervals
+                are merged.
+        """
+        starts, ends = [], []
+        for start, end in sorted(intervals):
+            if start > end:
+                raise ValueError(f"Invalid interval: {start}-{end}")
+            if ends and start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        object.__setattr__(self, "_starts", tuple(starts))
+        object.__setattr__(self, "_ends", tuple(ends))
+        object.__setattr__(self, "_count", sum(end - start + 1 for start, end in zip(starts, ends)))
+
+    @classmethod
+    def all(cls, count):
+        """
+        Args:
+            count (int): Number of sheets of the workbook.
+
+        Returns:
+            SheetRange: Sheets 1 to count, empty if count is 0.
+        """
+        return cls(((1, count),) if count > 0 else ())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SheetRange is immutable")
+
+    def __reduce__(self):
+        return SheetRange, (self.intervals,)
+
+    @property
+    def intervals(self):
+        """ tuple: (start, end) pairs, sorted and disjoint. """
+        return tuple(zip(self._starts, self._ends))
+
+    @property
+    def max(self):
+        """ int: Highest sheet number, None if the range is empty. """
+        return self._ends[-1] if self._ends else None
+
+    def __contains__(self, sheet):
+        position = bisect_right(self._starts, sheet) - 1
+        return position >= 0 and sheet <= self._ends[position]
+
+    def __iter__(self):
+        for start, end in zip(self._starts, self._ends):
+            yield from range(start, end + 1)
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __eq__(self, other):
+        if not isinstance(other, SheetRange):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __hash__(self):
+        return hash((self._starts, self._ends))
+
+    def __str__(self):
+        return ",".join(str(start) if start == end else f"{start}-{end}"
+                        for start, end in zip(self._starts, self._ends))
+
+    def __repr__(self):
+        return f"SheetRange('{self}')"
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(spec):
+    intervals = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        start, separator, end = item.partition("-")
+        if not start.isdigit() or (separator and not end.isdigit()):
+            raise ValueError(f"Invalid sheet range item: '{item}'")
+        start = int(start)
+        end = int(end) if separator else start
+        if start < 1:
+            raise ValueError(f"Sheet numbers start at 1: '{item}'")
+        if start > end:
+            raise ValueError(f"Interval start is greater than its end: '{item}'")
+        intervals.append((start, end))
+    return SheetRange(intervals)
+
+
+def parse_sheet_range(spec):
+    """
+    Parses a range spec such as "1,3,5-8". Parsed specs are cached, so the validators and the rewriter of every
+    file share a single parse.
+
+    Args:
+        spec (str | SheetRange | iterable): Range spec, or sheet numbers. A SheetRange is returned as it is.
+
+    Returns:
+        SheetRange: Sheets of the spec.
+
+    Raises:
+        ValueError: If an item is not a number or an n-m interval with n <= m.
+    """
+    if isinstance(spec, SheetRange):
+        return spec
+    if isinstance(spec, str):
+        return _parse(spec)
+    sheets = list(spec)
+    if any(not isinstance(sheet, int) or sheet < 1 for sheet in sheets):
+        raise ValueError(f"Sheet numbers must be integers starting at 1: {sheets}")
+    return SheetRange((sheet, sheet) for sheet in sheets)
@@ -0,0 +1,123 @@
+"""
+Round trip of rewrite_archive. append_raw_member and transform_member rely on private ZipFile internals, these tests
+fail if a Python upgrade changes them.
+
+Usage:
+    python -m unittest test_archive_rewriter
+"""
+import io
+import struct
+import zipfile
+import unittest
+from archive_rewriter import rewrite_archive
+
+TRANSFORMED = ("xl/worksheets/sheet1.xml", "xl/worksheets/sheet2.xml", "xl/worksheets/sheet3.xml")
+# Internals of zipfile used by archive_rewriter.
+ZIPFILE_INTERNALS = ("_writing", "_seekable", "_didModify", "start_dir", "_lock")
+
+
+class Upper:
+    """ Stream transformer that upper-cases its input. """
+
+    def feed(self, chunk):
+        return chunk.upper()
+
+    def flush(self):
+        return b""
+
+
+class Unseekable(io.RawIOBase):
+    """ Write-only stream without seek or tell, so zipfile writes data descriptors after each member. """
+
+    def __init__(self):
+        super(Unseekable, self).__init__()
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+
+def members():
+    """ Member name -> content, large enough to span several CHUNK_SIZE reads in the bigger parts. """
+    content = {name: b"<worksheet><sheetData>" + b"<row>cell %d</row>" % i * 100000 + b"</sheetData></worksheet>"
+               for i, name in enumerate(TRANSFORMED)}
+    content["[Content_Types].xml"] = b"<Types/>" * 100
+    content["xl/workbook.xml"] = b"<workbook/>" * 100
+    content["xl/media/image1.png"] = bytes(range(256)) * 4000
+    return content
+
+
+def zip64_extra(file_size, compress_size):
+    """ ZIP64 extra field carrying both sizes. """
+    return struct.pack("<HHQQ", 0x0001, 16, file_size, compress_size)
+
+
+def build_archive(data_descriptors=False, zip64=False):
+    """
+    Builds a source archive with deflated and stored members.
+
+    Args:
+        data_descriptors (bool): Writes to a stream that cannot seek, so every member has a data descriptor.
+        zip64 (bool): Forces ZIP64 local headers and adds a ZIP64 extra to the central directory entries.
+
+    Returns:
+        bytes: The archive.
+    """
+    target = Unseekable() if data_descriptors else io.BytesIO()
+    with zipfile.ZipFile(target, "w") as zip_out:
+        for name, data in members().items():
+            info = zipfile.ZipInfo(name, (2024, 1, 2, 3, 4, 6))
+            info.compress_type = zipfile.ZIP_STORED if name.endswith(".png") else zipfile.ZIP_DEFLATED
+            with zip_out.open(info, "w", force_zip64=zip64) as member:
+                member.write(data)
+            if zip64:
+                # Written to the central directory only, the local header already has one.
+                info.extra = zip64_extra(info.file_size, info.compress_size)
+    return (target.buffer if data_descriptors else target).getvalue()
+
+
+class RewriteArchiveTest(unittest.TestCase):
+
+    def test_zipfile_internals(self):
+        for name in ZIPFILE_INTERNALS:
+            self.assertTrue(hasattr(zipfile.ZipFile(io.BytesIO(), "w"), name), f"ZipFile.{name} is gone")
+        self.assertTrue(callable(getattr(zipfile.ZipFile, "_writecheck", None)), "ZipFile._writecheck is gone")
+        self.assertTrue(callable(getattr(zipfile, "_get_compressor", None)), "zipfile._get_compressor is gone")
+
+    def test_round_trip(self):
+        for data_descriptors in (False, True):
+            for zip64 in (False, True):
+                for threads in (1, 4):
+                    for compression in (None, zipfile.ZIP_DEFLATED):
+                        with self.subTest(data_descriptors=data_descriptors, zip64=zip64, threads=threads,
+                                          compression=compression):
+                            self.checkRoundTrip(build_archive(data_descriptors, zip64), threads, compression)
+
+    def checkRoundTrip(self, source, threads, compression):
+        target = io.BytesIO()
+        modified = rewrite_archive(io.BytesIO(source), target, {name: Upper for name in TRANSFORMED}, compression,
+                                   threads=threads)
+        self.assertEqual(modified, list(TRANSFORMED))
+        expected = members()
+        with zipfile.ZipFile(io.BytesIO(source)) as zip_in, zipfile.ZipFile(io.BytesIO(target.getvalue())) as zip_out:
+            self.assertIsNone(zip_out.testzip())
+            self.assertEqual(zip_out.namelist(), zip_in.namelist())
+            for info in zip_in.infolist():
+                written = zip_out.getinfo(info.filename)
+                self.assertFalse(written.flag_bits & 0x08, f"{info.filename} kept its data descriptor flag")
+                if info.filename in TRANSFORMED:
+                    self.assertEqual(zip_out.read(written), expected[info.filename].upper())
+                    continue
+                self.assertEqual(zip_out.read(written), expected[info.filename])
+                if compression in (None, info.compress_type):
+                    # Copied as raw compressed data.
+                    self.assertEqual((written.CRC, written.compress_size, written.file_size, written.compress_type),
+                                     (info.CRC, info.compress_size, info.file_size, info.compress_type),
+                                     info.filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
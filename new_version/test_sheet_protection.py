@@ -0,0 +1,88 @@
+"""
+SheetProtectionRemover and has_sheet_protection with the worksheet split at every possible chunk boundary.
+
+Usage:
+    python -m unittest test_sheet_protection
+"""
+import io
+import unittest
+from sheet_protection import MAX_ELEMENT_SIZE, SCAN_CHUNK_SIZE, SheetProtectionRemover, has_sheet_protection
+
+HEAD = (b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        b'<sheetData><row r="1"><c r="A1" t="inlineStr"><is><t>sheetProtection &lt;sheetProtection</t></is></c></row>'
+        b'</sheetData><sheetProtectionX/>')
+TAIL = b'<protectedRanges/><pageMargins left="0.7" right="0.7"/></worksheet>'
+# Forms of the element: attributes, namespace prefix, '>' and '/>' inside quoted values, an explicit closing tag and
+# attributes longer than the lookbehind of the remover.
+ELEMENTS = (
+    b'<sheetProtection sheet="1" objects="1" scenarios="1"/>',
+    b'<x:sheetProtection password="CAFE" sheet="1"/>',
+    b'<sheetProtection\n\talgorithmName="a>b" hashValue=\'c/>d\' sheet="1" />',
+    b'<sheetProtection sheet="1"></sheetProtection >',
+    b'<sheetProtection hashValue="' + b"A" * 200 + b'" saltValue="' + b"B" * 100 + b'" spinCount="100000"/>',
+)
+
+
+def feed_all(chunks):
+    """ Runs the chunks through a new remover and returns (output, removed). """
+    remover = SheetProtectionRemover()
+    output = b"".join(remover.feed(chunk) for chunk in chunks) + remover.flush()
+    return output, remover.removed
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class SheetProtectionRemoverTest(unittest.TestCase):
+
+    def test_every_split_point(self):
+        for element in ELEMENTS:
+            document = HEAD + element + TAIL
+            for point in range(len(document) + 1):
+                with self.subTest(element=element, point=point):
+                    self.assertEqual(feed_all([document[:point], document[point:]]), (HEAD + TAIL, True))
+
+    def test_chunk_sizes(self):
+        for element in ELEMENTS:
+            document = HEAD + element + TAIL
+            for size in list(range(1, 20)) + [63, 64, 65, 1000]:
+                with self.subTest(element=element, size=size):
+                    self.assertEqual(feed_all(split(document, size)), (HEAD + TAIL, True))
+
+    def test_unprotected_sheet_is_unchanged(self):
+        document = HEAD + TAIL
+        for point in range(len(document) + 1):
+            self.assertEqual(feed_all([document[:point], document[point:]]), (document, False))
+
+    def test_only_the_first_element_is_removed(self):
+        document = HEAD + ELEMENTS[0] + TAIL + ELEMENTS[1]
+        self.assertEqual(feed_all(split(document, 7)), (HEAD + TAIL + ELEMENTS[1], True))
+
+    def test_unterminated_element(self):
+        remover = SheetProtectionRemover()
+        remover.feed(HEAD + b'<sheetProtection sheet="1"')
+        self.assertRaises(ValueError, remover.flush)
+        remover = SheetProtectionRemover()
+        with self.assertRaises(ValueError):
+            for chunk in split(HEAD + b'<sheetProtection hashValue="' + b"A" * MAX_ELEMENT_SIZE, 4096):
+                remover.feed(chunk)
+
+
+class HasSheetProtectionTest(unittest.TestCase):
+
+    def test_element_across_scan_chunks(self):
+        for element in ELEMENTS:
+            for offset in range(1, len(element) + 1):
+                with self.subTest(element=element, offset=offset):
+                    padding = b" " * (SCAN_CHUNK_SIZE - offset)
+                    self.assertTrue(has_sheet_protection(io.BytesIO(padding + element + TAIL)))
+
+    def test_unprotected_sheet(self):
+        padding = b" " * (SCAN_CHUNK_SIZE - 10)
+        self.assertFalse(has_sheet_protection(io.BytesIO(padding + HEAD + TAIL)))
+
+
+if __name__ == "__main__":
+    unittest.main()
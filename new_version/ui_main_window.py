@@ -1,24 +1,38 @@
 import os
-from PyQt6 import uic
-from PyQt6.QtGui import QIcon
-from PyQt6.QtWidgets import QDialog, QFileDialog
+import time
+from PyQt6.QtWidgets import QApplication, QDialog, QFileDialog, QHeaderView
 from PyQt6.QtCore import QRegularExpression
 from PyQt6.QtGui import QRegularExpressionValidator
 from file_processor import FileProcessor
+from workbook_manifest import ManifestCache
+from file_list_model import FileListModel, COLUMN_FILE
+from ui_unlock_file import Ui_mainDialog
 import logging
 
-class MainWindow(QDialog):
+# BatchProcessor, UnlockWorker, RunJournal and FileDiscovery are imported when the first unlock starts, so they do not
+# delay the window on launch.
+
+class MainWindow(QDialog, Ui_mainDialog):
     """
     Main window class for the application.
-    Inherits from QDialog and sets up the UI components and event handlers.
+    Inherits from QDialog and sets up the UI components and event handlers. The widgets come from ui_unlock_file,
+    compiled from ui/unlockFile.ui by build_ui.py.
     """
+    # Estado de las ejecuciones sobre carpetas, para no reprocesar los archivos que no cambiaron.
+    journal_path = os.path.join(os.path.expanduser("~"), ".excel_breaker", "journal.sqlite")
+    compression_policies = [FileProcessor.compression_keep, FileProcessor.compression_deflate,
+                            FileProcessor.compression_stored]
+
     def __init__(self):
         """
         Initializes the main window, sets up the UI components and connects signals to slots.
         """
         super(MainWindow, self).__init__()
-        uic.loadUi("ui/unlockFile.ui", self)
-        self.file_processor = FileProcessor()
+        self.setupUi(self)
+        self.manifest_cache = ManifestCache()
+        self.file_processor = FileProcessor(manifest_cache=self.manifest_cache)
+        self.worker = None
+        self.journal = None
         self.setup_ui()
 
     def setup_ui(self):
@@ -26,10 +40,15 @@ class MainWindow(QDialog):
         Sets up the user interface components.
         """
         self.sheetValidator()
+        self.setupFileList()
         self.continuar.clicked.connect(self.setFileSettings)
         self.cleanOptionFiles.clicked.connect(self.clean)
         self.uploadChoice.clicked.connect(self.browsefiles)
         self.unlockFile.clicked.connect(self.unlock)
+        self.cancelUnlock.clicked.connect(self.cancel)
+        QApplication.instance().aboutToQuit.connect(self.stopWorker)
+        self.compressionChoice.currentIndexChanged.connect(self.setCompressionSettings)
+        self.setCompressionSettings()
 
     def sheetValidator(self):
         """ Función que verifica la entrada del rango de páginas, solo se permite números seguido de (,) o (-)
@@ -38,6 +57,31 @@ class MainWindow(QDialog):
         noSpaceValidator = QRegularExpressionValidator(QRegularExpression("^(?!0)[1-9][0-9]*(?:,[1-9][0-9]*|-[1-9][0-9]*)+$"), self.rangeSheets)
         self.rangeSheets.setValidator(noSpaceValidator)
 
+    def setupFileList(self):
+        """ Conecta la tabla de archivos con su modelo. Los anchos de columna y el alto de fila son fijos, así la
+        tabla no mide el contenido de cada fila y sigue fluida con decenas de miles de archivos.
+        """
+        self.fileModel = FileListModel(self)
+        self.fileList.setModel(self.fileModel)
+        header = self.fileList.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        header.setSectionResizeMode(COLUMN_FILE, QHeaderView.ResizeMode.Stretch)
+        for column, width in enumerate((0, 85, 70, 60, 55)):
+            if width:
+                self.fileList.setColumnWidth(column, width)
+        rows = self.fileList.verticalHeader()
+        rows.setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        rows.setDefaultSectionSize(20)
+
+    def setCompressionSettings(self):
+        """ Aplica la política de compresión elegida al procesador de archivos. El nivel solo se usa con Deflate. """
+        compression = self.compression_policies[self.compressionChoice.currentIndex()]
+        is_deflate = compression == FileProcessor.compression_deflate
+        self.compressionLevel.setEnabled(is_deflate)
+        compresslevel = self.compressionLevel.value() if is_deflate else None
+        logging.info(f"Compression policy: {compression}, level: {compresslevel}")
+        self.file_processor = FileProcessor(compression, compresslevel, self.manifest_cache)
+
     def clean(self):
         """ Limpia los campos de entrada, habilita e inhabilita los grupos de contenido dentro de la GUI. """
         logging.info("Cleaning input fields")
@@ -46,6 +90,7 @@ class MainWindow(QDialog):
         self.fileGroup.setEnabled(False)
         self.cleanOptionFiles.setEnabled(False)
         self.continuar.setEnabled(True)
+        self.fileModel.clear()
 
     def setFileSettings(self):
         """ Habilita o deshabilita las opciones de la GUI dependiendo de la primer elección de opciones como:
@@ -56,6 +101,8 @@ class MainWindow(QDialog):
         self.fileGroup.setEnabled(True)
         self.cleanOptionFiles.setEnabled(True)
         self.continuar.setEnabled(False)
+        # Los archivos seleccionados se ven en la tabla, el campo solo muestra cuántos son.
+        self.inputFile.setReadOnly(self.multipleFiles.isChecked())
         if self.manyFiles.isChecked():
             self.intervalLabel.setEnabled(False)
             self.rangeSheets.setEnabled(False)
@@ -81,17 +128,117 @@ class MainWindow(QDialog):
                 logging.info(f"Selected directory: {directory}")
             elif self.multipleFiles.isChecked():
                 fnames, _ = QFileDialog.getOpenFileNames(self, caption="Abrir archivo", filter="Archivos XLSX (*.xlsx)")
-                self.inputFile.setText(";".join(fnames))
-                logging.info(f"Selected files: {fnames}")
+                self.fileModel.setFiles(fnames)
+                count = self.fileModel.rowCount()
+                self.inputFile.setText(f"{count} archivos seleccionados" if count else "")
+                logging.info(f"Selected {count} files")
         except Exception as e:
             logging.error(f"Error browsing files: {e}")
 
+    def startWorker(self, files, range_sheets, total, workers=None, success_message="", journal=None,
+                    skip_unprotected=False, discovery=None):
+        """ Inicia el desbloqueo de los archivos en un hilo de trabajo, para que la ventana siga respondiendo.
+        Args:
+            files: Rutas de los archivos a desbloquear, se recorren en el hilo de trabajo.
+            range_sheets: Intervalo de hojas a desbloquear en cada archivo, vacío para todas las hojas.
+            total: Cantidad de archivos, 0 si no se conoce de antemano.
+            workers: Cantidad de procesos, None para usar todos los núcleos.
+            success_message: Mensaje que se muestra si todos los archivos se desbloquean.
+            journal: RunJournal para omitir los archivos que no cambiaron desde la última ejecución.
+            skip_unprotected: Revisa cada archivo antes y deja sin tocar los que no tienen hojas protegidas. Solo
+                conviene al recorrer un directorio, en un archivo protegido la revisión lee una hoja dos veces.
+            discovery: FileDiscovery que produce los archivos, cancelar lo detiene aunque todavía no encontró ninguno.
+        """
+        from batch_processor import BatchProcessor
+        from unlock_worker import UnlockWorker
+        # A file unlocked in the worker thread reuses the manifest read by the validation in unlock.
+        batch = BatchProcessor(workers, self.file_processor.compression, self.file_processor.compresslevel,
+                               skip_unprotected=skip_unprotected, journal=journal,
+                               manifest_cache=self.manifest_cache)
+        self.journal = journal
+        self.success_message = success_message
+        self.last_message = ""
+        self.start_time = time.perf_counter()
+        self.progressBar.setRange(0, total)
+        self.progressBar.setValue(0)
+        self.throughputText.setText("")
+        self.messageText.setText("Desbloqueando...")
+        self.worker = UnlockWorker(batch, files, range_sheets, total, self, discovery)
+        self.worker.progress.connect(self.updateProgress)
+        self.worker.fileFinished.connect(self.fileFinished)
+        self.worker.batchFinished.connect(self.batchFinished)
+        # The worker is a child of the window, without this every run would stay alive until the window closes.
+        self.worker.finished.connect(self.worker.deleteLater)
+        self.cancelUnlock.setEnabled(True)
+        self.worker.start()
+
+    def updateProgress(self, done, total, processed_bytes, current_file):
+        """ Actualiza la barra de progreso y la velocidad de desbloqueo. """
+        if total:
+            self.progressBar.setValue(done)
+        elapsed = max(time.perf_counter() - self.start_time, 1e-6)
+        self.throughputText.setText(
+            f"{done} archivos, {processed_bytes / 1e6:.1f} MB, {done / elapsed:.1f} archivos/s, "
+            f"{processed_bytes / 1e6 / elapsed:.1f} MB/s - {os.path.basename(current_file)}")
+
+    def fileFinished(self, result):
+        """ Registra el resultado de cada archivo y lo muestra en la tabla. """
+        logging.info(result["message"])
+        self.last_message = result["message"]
+        self.fileModel.updateResult(result)
+
+    def batchFinished(self, all_unlocked, cancelled):
+        """ Muestra el resultado del desbloqueo y habilita de nuevo los botones. """
+        self.fileModel.flush()
+        self.progressBar.setRange(0, max(self.progressBar.maximum(), 1))
+        self.progressBar.setValue(self.progressBar.maximum() if not cancelled else self.progressBar.value())
+        if cancelled:
+            self.messageText.setText("Desbloqueo cancelado. Los archivos ya procesados quedaron desbloqueados.")
+        elif not self.success_message:
+            self.messageText.setText(self.last_message)
+        elif all_unlocked:
+            self.messageText.setText(self.success_message)
+        else:
+            self.messageText.setText("Ocurrió un error al intentar desbloquear algunos archivos.")
+        if self.journal is not None:
+            logging.info(f"{self.journal.unchanged} files unchanged since the last run")
+            self.journal.close()
+            self.journal = None
+        self.cancelUnlock.setEnabled(False)
+        self.unlockFile.setEnabled(True)
+        self.worker = None
+
+    def cancel(self):
+        """ Pide al hilo de trabajo que se detenga entre archivos. """
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancelUnlock.setEnabled(False)
+            self.messageText.setText("Cancelando, esperando a que terminen los archivos en proceso...")
+
+    def stopWorker(self):
+        """ Detiene el hilo de trabajo antes de cerrar la aplicación. """
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.wait()
+
+    def iterDirectory(self, directory, discovery):
+        """ Recorre el directorio y sus subdirectorios en paralelo y devuelve los archivos .xlsx a medida que los
+        encuentra, sin los archivos de bloqueo de Excel (~$). Borra los temporales de ejecuciones interrumpidas.
+        Se consume en el hilo de trabajo.
+        Args:
+            directory: Directorio a recorrer.
+            discovery: FileDiscovery que hace el recorrido, su método cancel lo detiene.
+        """
+        return discovery.discover([directory])
+
     def unlock(self):
         """
         Handles the unlock button click event.
-        Processes the input file(s) and displays the result to the user.
+        Validates the input and starts unlocking the file(s) in a worker thread.
         """
         self.unlockFile.setEnabled(False)
+        self.setCompressionSettings()
+        started = False
         try:
             file_path = self.inputFile.text()
             range_sheets = self.rangeSheets.text()
@@ -101,7 +248,7 @@ class MainWindow(QDialog):
             if self.manyFiles.isChecked() and not file_path:
                 self.messageText.setText("Seleccione un directorio")
                 return
-            if self.multipleFiles.isChecked() and not file_path:
+            if self.multipleFiles.isChecked() and not self.fileModel.rowCount():
                 self.messageText.setText("Seleccione los archivos")
                 return
             if self.oneFile.isChecked() and (file_path != "" or range_sheets != ""):
@@ -109,43 +256,29 @@ class MainWindow(QDialog):
                     self.messageText.setText(
                         "Alguna página ingresada excede la cantidad real de páginas del documento.")
                     return
-                unlocked_sheets, msg = self.file_processor.process_single_file(file_path, range_sheets)
-                self.messageText.setText(msg)
+                self.fileModel.setFiles([file_path])
+                self.startWorker([file_path], range_sheets, 1, workers=1)
+                started = True
             elif self.manyFiles.isChecked():
-                all_unlocked = True
-                for root, _, files in os.walk(file_path):
-                    for file in files:
-                        if file.endswith(".xlsx"):
-                            full_path = os.path.join(root, file)
-                            if not self.file_processor.rangeSheetsValidator(full_path, range_sheets):
-                                self.messageText.setText(
-                                    "Alguna página ingresada excede la cantidad real de páginas del documento.")
-                                return
-                            unlocked_sheets, msg = self.file_processor.process_single_file(full_path)
-                            if not unlocked_sheets:
-                                all_unlocked = False
-                if all_unlocked:
-                    self.messageText.setText(
-                        f"Todos los archivos en el directorio {file_path} han sido desbloqueados con éxito.")
-                else:
-                    self.messageText.setText("Ocurrió un error al intentar desbloquear algunos archivos.")
+                from run_journal import RunJournal
+                from file_discovery import FileDiscovery
+                # La tabla se llena con los resultados, a medida que se encuentran los archivos.
+                self.fileModel.clear()
+                discovery = FileDiscovery()
+                files = self.iterDirectory(file_path, discovery)
+                self.startWorker(files, "", 0, success_message=(
+                    f"Todos los archivos en el directorio {file_path} han sido desbloqueados con éxito."),
+                    journal=RunJournal(self.journal_path), skip_unprotected=True, discovery=discovery)
+                started = True
             elif self.multipleFiles.isChecked():
-                files = file_path.split(";")
-                all_unlocked = True
-                for file in files:
-                    if not self.file_processor.rangeSheetsValidator(file, range_sheets):
-                        self.messageText.setText(
-                            "Alguna página ingresada excede la cantidad real de páginas del documento.")
-                        return
-                    unlocked_sheets, msg = self.file_processor.process_single_file(file, range_sheets)
-                    if not unlocked_sheets:
-                        all_unlocked = False
-                if all_unlocked:
-                    self.messageText.setText("Todos los archivos seleccionados han sido desbloqueados con éxito.")
-                else:
-                    self.messageText.setText("Ocurrió un error al intentar desbloquear algunos archivos.")
+                files = self.fileModel.paths()
+                self.fileModel.resetStatus()
+                self.startWorker(files, range_sheets, len(files), success_message=(
+                    "Todos los archivos seleccionados han sido desbloqueados con éxito."))
+                started = True
         except Exception as e:
             logging.error(f"Error unlocking files: {e}")
             self.messageText.setText("Ocurrió un error al intentar desbloquear los archivos.")
         finally:
-            self.unlockFile.setEnabled(True)
\ No newline at end of file
+            if not started:
+                self.unlockFile.setEnabled(True)
@@ -0,0 +1,198 @@
+# Form implementation generated from reading ui file 'ui/unlockFile.ui'
+#
+# Created by: PyQt6 UI code generator 6.11.0
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic6 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt6 import QtCore, QtGui, QtWidgets
+
+
+class Ui_mainDialog(object):
+    def setupUi(self, mainDialog):
+        mainDialog.setObjectName("mainDialog")
+        mainDialog.resize(545, 630)
+        mainDialog.setStyleSheet("QWidget#mainDialog{\n"
+"background-color: qlineargradient(spread:pad, x1:0, y1:0, x2:1, y2:0, stop:0 rgba(9, 174, 174, 255), stop:0.403409 rgba(176, 215, 235, 255), stop:0.98 rgba(173, 239, 72, 255), stop:1 rgba(0, 0, 0, 0));}")
+        self.label = QtWidgets.QLabel(parent=mainDialog)
+        self.label.setGeometry(QtCore.QRect(20, 20, 521, 16))
+        font = QtGui.QFont()
+        font.setPointSize(10)
+        self.label.setFont(font)
+        self.label.setObjectName("label")
+        self.optionFiles = QtWidgets.QGroupBox(parent=mainDialog)
+        self.optionFiles.setGeometry(QtCore.QRect(20, 50, 511, 71))
+        self.optionFiles.setStyleSheet("")
+        self.optionFiles.setObjectName("optionFiles")
+        self.oneFile = QtWidgets.QRadioButton(parent=self.optionFiles)
+        self.oneFile.setGeometry(QtCore.QRect(10, 30, 82, 17))
+        self.oneFile.setChecked(True)
+        self.oneFile.setObjectName("oneFile")
+        self.manyFiles = QtWidgets.QRadioButton(parent=self.optionFiles)
+        self.manyFiles.setEnabled(True)
+        self.manyFiles.setGeometry(QtCore.QRect(110, 30, 101, 17))
+        self.manyFiles.setObjectName("manyFiles")
+        self.multipleFiles = QtWidgets.QRadioButton(parent=self.optionFiles)
+        self.multipleFiles.setEnabled(True)
+        self.multipleFiles.setGeometry(QtCore.QRect(230, 30, 101, 17))
+        self.multipleFiles.setObjectName("multipleFiles")
+        self.line = QtWidgets.QFrame(parent=mainDialog)
+        self.line.setGeometry(QtCore.QRect(10, 160, 521, 20))
+        font = QtGui.QFont()
+        font.setPointSize(10)
+        self.line.setFont(font)
+        self.line.setLineWidth(3)
+        self.line.setFrameShape(QtWidgets.QFrame.Shape.HLine)
+        self.line.setFrameShadow(QtWidgets.QFrame.Shadow.Sunken)
+        self.line.setObjectName("line")
+        self.fileGroup = QtWidgets.QGroupBox(parent=mainDialog)
+        self.fileGroup.setEnabled(False)
+        self.fileGroup.setGeometry(QtCore.QRect(20, 180, 511, 141))
+        self.fileGroup.setStyleSheet("")
+        self.fileGroup.setObjectName("fileGroup")
+        self.uploadChoice = QtWidgets.QPushButton(parent=self.fileGroup)
+        self.uploadChoice.setGeometry(QtCore.QRect(10, 30, 81, 31))
+        self.uploadChoice.setStyleSheet("")
+        icon = QtGui.QIcon()
+        icon.addPixmap(QtGui.QPixmap("ui/icons/file.png"), QtGui.QIcon.Mode.Normal, QtGui.QIcon.State.Off)
+        self.uploadChoice.setIcon(icon)
+        self.uploadChoice.setObjectName("uploadChoice")
+        self.inputFile = QtWidgets.QLineEdit(parent=self.fileGroup)
+        self.inputFile.setGeometry(QtCore.QRect(130, 30, 371, 31))
+        self.inputFile.setObjectName("inputFile")
+        self.intervalLabel = QtWidgets.QLabel(parent=self.fileGroup)
+        self.intervalLabel.setEnabled(False)
+        self.intervalLabel.setGeometry(QtCore.QRect(10, 100, 111, 16))
+        self.intervalLabel.setStyleSheet("Color: rgb(0, 0, 0)")
+        self.intervalLabel.setObjectName("intervalLabel")
+        self.rangeSheets = QtWidgets.QLineEdit(parent=self.fileGroup)
+        self.rangeSheets.setEnabled(False)
+        self.rangeSheets.setGeometry(QtCore.QRect(130, 90, 111, 31))
+        self.rangeSheets.setInputMethodHints(QtCore.Qt.InputMethodHint.ImhFormattedNumbersOnly|QtCore.Qt.InputMethodHint.ImhPreferNumbers)
+        self.rangeSheets.setMaxLength(30)
+        self.rangeSheets.setObjectName("rangeSheets")
+        self.clearInputRange = QtWidgets.QPushButton(parent=self.fileGroup)
+        self.clearInputRange.setEnabled(False)
+        self.clearInputRange.setGeometry(QtCore.QRect(250, 90, 31, 31))
+        self.clearInputRange.setStyleSheet("")
+        self.clearInputRange.setText("")
+        icon1 = QtGui.QIcon()
+        icon1.addPixmap(QtGui.QPixmap("ui/icons/eraser.png"), QtGui.QIcon.Mode.Normal, QtGui.QIcon.State.Off)
+        icon1.addPixmap(QtGui.QPixmap("ui/icons/eraser_color.png"), QtGui.QIcon.Mode.Normal, QtGui.QIcon.State.On)
+        self.clearInputRange.setIcon(icon1)
+        self.clearInputRange.setObjectName("clearInputRange")
+        self.uploadChoice.raise_()
+        self.inputFile.raise_()
+        self.rangeSheets.raise_()
+        self.clearInputRange.raise_()
+        self.intervalLabel.raise_()
+        self.unlockFile = QtWidgets.QPushButton(parent=mainDialog)
+        self.unlockFile.setEnabled(False)
+        self.unlockFile.setGeometry(QtCore.QRect(220, 590, 101, 31))
+        self.unlockFile.setStyleSheet("")
+        icon2 = QtGui.QIcon()
+        icon2.addPixmap(QtGui.QPixmap("ui/icons/unlock.png"), QtGui.QIcon.Mode.Normal, QtGui.QIcon.State.Off)
+        self.unlockFile.setIcon(icon2)
+        self.unlockFile.setObjectName("unlockFile")
+        self.continuar = QtWidgets.QPushButton(parent=mainDialog)
+        self.continuar.setGeometry(QtCore.QRect(20, 130, 75, 23))
+        self.continuar.setStyleSheet("")
+        self.continuar.setObjectName("continuar")
+        self.messageText = QtWidgets.QLabel(parent=mainDialog)
+        self.messageText.setGeometry(QtCore.QRect(36, 540, 481, 41))
+        self.messageText.setStyleSheet("")
+        self.messageText.setText("")
+        self.messageText.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
+        self.messageText.setWordWrap(True)
+        self.messageText.setObjectName("messageText")
+        self.cleanOptionFiles = QtWidgets.QPushButton(parent=mainDialog)
+        self.cleanOptionFiles.setEnabled(False)
+        self.cleanOptionFiles.setGeometry(QtCore.QRect(440, 460, 75, 23))
+        self.cleanOptionFiles.setStyleSheet("")
+        self.cleanOptionFiles.setObjectName("cleanOptionFiles")
+        self.compressionLabel = QtWidgets.QLabel(parent=mainDialog)
+        self.compressionLabel.setGeometry(QtCore.QRect(30, 463, 71, 16))
+        self.compressionLabel.setObjectName("compressionLabel")
+        self.compressionChoice = QtWidgets.QComboBox(parent=mainDialog)
+        self.compressionChoice.setGeometry(QtCore.QRect(110, 460, 131, 23))
+        self.compressionChoice.setObjectName("compressionChoice")
+        self.compressionChoice.addItem("")
+        self.compressionChoice.addItem("")
+        self.compressionChoice.addItem("")
+        self.compressionLevel = QtWidgets.QSpinBox(parent=mainDialog)
+        self.compressionLevel.setGeometry(QtCore.QRect(250, 460, 42, 23))
+        self.compressionLevel.setMinimum(0)
+        self.compressionLevel.setMaximum(9)
+        self.compressionLevel.setProperty("value", 6)
+        self.compressionLevel.setObjectName("compressionLevel")
+        self.progressBar = QtWidgets.QProgressBar(parent=mainDialog)
+        self.progressBar.setGeometry(QtCore.QRect(36, 495, 395, 20))
+        self.progressBar.setProperty("value", 0)
+        self.progressBar.setObjectName("progressBar")
+        self.cancelUnlock = QtWidgets.QPushButton(parent=mainDialog)
+        self.cancelUnlock.setEnabled(False)
+        self.cancelUnlock.setGeometry(QtCore.QRect(440, 493, 75, 23))
+        self.cancelUnlock.setObjectName("cancelUnlock")
+        self.throughputText = QtWidgets.QLabel(parent=mainDialog)
+        self.throughputText.setGeometry(QtCore.QRect(36, 520, 481, 16))
+        self.throughputText.setText("")
+        self.throughputText.setObjectName("throughputText")
+        self.fileList = QtWidgets.QTableView(parent=mainDialog)
+        self.fileList.setGeometry(QtCore.QRect(20, 330, 511, 120))
+        self.fileList.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.fileList.setAlternatingRowColors(True)
+        self.fileList.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.fileList.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.fileList.setWordWrap(False)
+        self.fileList.setObjectName("fileList")
+        self.fileList.verticalHeader().setVisible(False)
+        self.label.raise_()
+        self.optionFiles.raise_()
+        self.line.raise_()
+        self.unlockFile.raise_()
+        self.continuar.raise_()
+        self.messageText.raise_()
+        self.cleanOptionFiles.raise_()
+        self.fileGroup.raise_()
+        self.compressionLabel.raise_()
+        self.compressionChoice.raise_()
+        self.compressionLevel.raise_()
+        self.progressBar.raise_()
+        self.cancelUnlock.raise_()
+        self.throughputText.raise_()
+        self.fileList.raise_()
+
+        self.retranslateUi(mainDialog)
+        self.cleanOptionFiles.clicked.connect(self.inputFile.clear) # type: ignore
+        self.cleanOptionFiles.clicked.connect(self.rangeSheets.clear) # type: ignore
+        self.clearInputRange.clicked.connect(self.rangeSheets.clear) # type: ignore
+        self.cleanOptionFiles.clicked.connect(self.messageText.clear) # type: ignore
+        QtCore.QMetaObject.connectSlotsByName(mainDialog)
+
+    def retranslateUi(self, mainDialog):
+        _translate = QtCore.QCoreApplication.translate
+        mainDialog.setWindowTitle(_translate("mainDialog", "Dialog"))
+        self.label.setText(_translate("mainDialog", "Elija entre desbloquear un archivo, varios archivos, una hoja o varias hojas:"))
+        self.optionFiles.setTitle(_translate("mainDialog", "Opciones de desbloqueo"))
+        self.oneFile.setText(_translate("mainDialog", "Un archivo"))
+        self.manyFiles.setToolTip(_translate("mainDialog", "<html><head/><body><p>Esta opción permite que se desbloqueen todas las páginas de todos los archivos del directorio o carpeta seleccionado.</p></body></html>"))
+        self.manyFiles.setText(_translate("mainDialog", "Una carpeta"))
+        self.multipleFiles.setText(_translate("mainDialog", "Varios archivos"))
+        self.fileGroup.setTitle(_translate("mainDialog", "Cargar selección"))
+        self.uploadChoice.setText(_translate("mainDialog", "Cargar"))
+        self.intervalLabel.setText(_translate("mainDialog", "Intervalo de hojas"))
+        self.rangeSheets.setToolTip(_translate("mainDialog", "<html><head/><body><p>Ingrese las páginas a desbloquear. <br/>Permitido: 1,2,3-5.<br/>No permitido: 7-2, 4-1<br/>No permitido: 1- o 1,</p></body></html>"))
+        self.clearInputRange.setToolTip(_translate("mainDialog", "Borrar el rango de hojas ingresado."))
+        self.unlockFile.setText(_translate("mainDialog", "Desbloquear"))
+        self.continuar.setText(_translate("mainDialog", "Continuar"))
+        self.cleanOptionFiles.setText(_translate("mainDialog", "Limpiar"))
+        self.compressionLabel.setText(_translate("mainDialog", "Compresión"))
+        self.compressionChoice.setToolTip(_translate("mainDialog", "<html><head/><body><p>Mantener original: más rápido, conserva el tamaño.<br/>Deflate: archivo más pequeño, más lento.<br/>Sin compresión: el más rápido, archivo más grande.</p></body></html>"))
+        self.compressionChoice.setItemText(0, _translate("mainDialog", "Mantener original"))
+        self.compressionChoice.setItemText(1, _translate("mainDialog", "Deflate"))
+        self.compressionChoice.setItemText(2, _translate("mainDialog", "Sin compresión"))
+        self.compressionLevel.setToolTip(_translate("mainDialog", "Nivel de compresión (0-9) de las partes que se vuelven a comprimir."))
+        self.cancelUnlock.setToolTip(_translate("mainDialog", "Detiene el desbloqueo después de los archivos que se están procesando."))
+        self.cancelUnlock.setText(_translate("mainDialog", "Cancelar"))
+        self.fileList.setToolTip(_translate("mainDialog", "Archivos seleccionados con el estado, el tamaño, las hojas desbloqueadas y el tiempo de cada uno."))
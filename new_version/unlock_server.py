@@ -0,0 +1,256 @@
+"""
+Local HTTP service that unlocks workbooks uploaded by other tools, without Qt. Stdlib only.
+
+    POST /unlock?sheets=1,3-5    body: the .xlsx file    ->  200 with the unlocked .xlsx
+    GET  /health                                         ->  200 with the pool state as JSON
+
+Example:
+    curl --data-binary @book.xlsx -o unlocked.xlsx "http://127.0.0.1:8080/unlock?sheets=1-3"
+"""
+import os
+import json
+import time
+import logging
+import zipfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from file_processor import FileProcessor
+from batch_processor import init_worker, worker_processor
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Default largest upload accepted.
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+# Seconds a client is told to wait when the queue is full.
+RETRY_AFTER = 1
+
+def _unlock(data, range_sheets):
+    """ Unlocks one upload inside a worker process. Returns the unlocked workbook and the seconds it took. """
+    start = time.perf_counter()
+    unlocked = worker_processor().unlock_bytes(data, range_sheets)
+    return unlocked, time.perf_counter() - start
+
+
+class UnlockService:
+    """
+    Bounded process pool shared by the request threads. At most workers + queue_size requests are admitted at the
+    same time, the rest are rejected at once so that clients can back off instead of piling up. A slot is held
+    until the job leaves the pool, not until its request gives up, so timed out jobs still count against the bound.
+    """
+
+    def __init__(self, workers=None, queue_size=None, compression=FileProcessor.compression_keep,
+                 compresslevel=None, max_bytes=DEFAULT_MAX_BYTES, timeout=None):
+        """
+        Args:
+            workers (int): Worker processes. None uses the number of CPUs.
+            queue_size (int): Requests that can wait for a free worker. None allows two per worker.
+            compression (str): Compression policy passed to FileProcessor.
+            compresslevel (int): Compression level passed to FileProcessor.
+            max_bytes (int): Largest upload accepted.
+            timeout (float): Seconds a request can take once admitted, None waits for ever.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = self.workers * 2 if queue_size is None else queue_size
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.served = 0
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._executor = self._createExecutor()
+
+    def _createExecutor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                   initargs=(self.compression, self.compresslevel))
+
+    def admit(self):
+        """
+        Reserves a place for a request without waiting.
+
+        Returns:
+            bool: False if the pool and its queue are full, the request must be rejected.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self._in_flight += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self.served += 1
+        self._slots.release()
+
+    def unlock(self, data, range_sheets):
+        """
+        Unlocks an upload on the pool. Must be called after admit, and it takes over the slot: it is released when
+        the job finishes or is cancelled, even if the request stopped waiting for it.
+
+        Returns:
+            tuple: (unlocked bytes, seconds waiting for a worker, seconds unlocking).
+
+        Raises:
+            ValueError: If the sheet range is not valid for the workbook.
+            zipfile.BadZipFile: If the upload is not a workbook.
+            concurrent.futures.TimeoutError: If the request took longer than timeout.
+        """
+        submitted = time.perf_counter()
+        executor = self._executor
+        future = None
+        try:
+            future = executor.submit(_unlock, data, range_sheets)
+            future.add_done_callback(lambda _: self.release())
+            unlocked, unlock_seconds = future.result(self.timeout)
+        except FutureTimeoutError:
+            # A job still waiting for a worker is dropped, a running one keeps its slot until it ends.
+            future.cancel()
+            raise
+        except BrokenProcessPool:
+            # A worker died, e.g. killed by the OOM killer. The pool cannot be used any more, so it is replaced.
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = self._createExecutor()
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            if future is None:
+                self.release()
+        total = time.perf_counter() - submitted
+        return unlocked, max(0.0, total - unlock_seconds), unlock_seconds
+
+    def status(self):
+        """
+        Returns:
+            dict: Capacity and counters of the service.
+        """
+        with self._lock:
+            return {"workers": self.workers, "queue_size": self.queue_size, "in_flight": self._in_flight,
+                    "served": self.served, "rejected": self.rejected, "max_bytes": self.max_bytes}
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class UnlockRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles the requests of an UnlockServer. The upload is the raw request body, the sheets are given in the
+    query string and the response carries a Server-Timing header with the time spent in each step.
+    """
+    server_version = "ExcelBreaker/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/health":
+            self.sendError(HTTPStatus.NOT_FOUND, "Ruta desconocida.")
+            return
+        self.sendBody(HTTPStatus.OK, json.dumps(self.server.service.status()).encode(), "application/json")
+
+    def do_POST(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        if url.path != "/unlock":
+            self.sendError(HTTPStatus.NOT_FOUND, "Ruta desconocida.")
+            return
+        service = self.server.service
+        length = self.headers.get("Content-Length")
+        if length is None or not length.isdigit():
+            self.sendError(HTTPStatus.LENGTH_REQUIRED, "Falta el encabezado Content-Length.")
+            return
+        length = int(length)
+        if length > service.max_bytes:
+            self.sendError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                           f"El archivo excede el tamaño máximo de {service.max_bytes} bytes.")
+            return
+        range_sheets = parse_qs(url.query).get("sheets", [""])[0]
+        if not service.admit():
+            self.sendError(HTTPStatus.SERVICE_UNAVAILABLE, "El servicio está ocupado, reintente más tarde.",
+                           {"Retry-After": str(RETRY_AFTER)})
+            return
+        try:
+            data = self.rfile.read(length)
+        except OSError:
+            service.release()
+            raise
+        received = time.perf_counter()
+        try:
+            unlocked, queue_seconds, unlock_seconds = service.unlock(data, range_sheets)
+        except (ValueError, zipfile.BadZipFile) as e:
+            self.sendError(HTTPStatus.UNPROCESSABLE_ENTITY, str(e))
+            return
+        except FutureTimeoutError:
+            self.sendError(HTTPStatus.GATEWAY_TIMEOUT, "El archivo tardó demasiado en desbloquearse.")
+            return
+        except Exception as e:
+            logging.error(f"Error unlocking upload: {e}")
+            self.sendError(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error al desbloquear el archivo: {e}")
+            return
+        timing = (f"upload;dur={(received - start) * 1000:.1f}, queue;dur={queue_seconds * 1000:.1f}, "
+                  f"unlock;dur={unlock_seconds * 1000:.1f}, total;dur={(time.perf_counter() - start) * 1000:.1f}")
+        self.sendBody(HTTPStatus.OK, unlocked, XLSX_CONTENT_TYPE,
+                      {"Server-Timing": timing, "Content-Disposition": 'attachment; filename="unlocked.xlsx"'})
+
+    def sendBody(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def sendError(self, status, message, headers=None):
+        # The body of a rejected upload is not read, so the connection cannot be reused.
+        self.close_connection = True
+        headers = dict(headers or {}, Connection="close")
+        self.sendBody(status, json.dumps({"error": message}, ensure_ascii=False).encode(), "application/json",
+                      headers)
+
+    def log_message(self, format, *args):
+        logging.info("%s - %s", self.address_string(), format % args)
+
+
+class UnlockServer(ThreadingHTTPServer):
+    """
+    HTTP server with one thread per connection, the unlocking itself runs on the pool of an UnlockService.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        """
+        Args:
+            address (tuple): (host, port) to listen on, port 0 picks a free one.
+            service (UnlockService): Pool shared by the requests.
+        """
+        super(UnlockServer, self).__init__(address, UnlockRequestHandler)
+        self.service = service
+
+
+def serve(host="127.0.0.1", port=8080, **service_options):
+    """
+    Runs the service until interrupted.
+
+    Args:
+        host (str): Interface to listen on, 127.0.0.1 keeps the service local.
+        port (int): Port to listen on.
+        service_options: Arguments of UnlockService.
+    """
+    service = UnlockService(**service_options)
+    server = UnlockServer((host, port), service)
+    logging.warning(f"Listening on http://{server.server_address[0]}:{server.server_address[1]} "
+                    f"with {service.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
@@ -0,0 +1,77 @@
+import logging
+from PyQt6.QtCore import QThread, pyqtSignal
+
+
+class UnlockWorker(QThread):
+    """
+    Runs a BatchProcessor outside the GUI thread and reports the progress through signals, so the window stays
+    responsive. Cancellation is checked between files, including the candidates that are still being found or
+    filtered by the journal; a file that is being processed is always finished.
+    """
+    # Files done, total files (0 if unknown), bytes processed, last file finished.
+    progress = pyqtSignal(int, int, float, str)
+    # Result dict of each file, see BatchProcessor.makeResult.
+    fileFinished = pyqtSignal(dict)
+    # Whether every file was unlocked and whether the run was cancelled.
+    batchFinished = pyqtSignal(bool, bool)
+
+    def __init__(self, batch_processor, files, range_sheets, total=0, parent=None, discovery=None):
+        """
+        Args:
+            batch_processor (BatchProcessor): Engine used to unlock the files.
+            files (iterable): Paths of the files to be unlocked, it is consumed in the worker thread.
+            range_sheets (str): Range of sheets to be unlocked in every file, "" for all the sheets.
+            total (int): Number of files, 0 if it is not known in advance.
+            parent (QObject): Parent object.
+            discovery (FileDiscovery): Walk that produces files, if any. Cancelling stops it even while it has not
+                found a file yet.
+        """
+        super(UnlockWorker, self).__init__(parent)
+        self.batch_processor = batch_processor
+        self.files = files
+        self.range_sheets = range_sheets
+        self.total = total
+        self.discovery = discovery
+
+    def cancel(self):
+        """ Asks the worker to stop after the files that are being processed. """
+        logging.info("Cancellation requested")
+        self.requestInterruption()
+        if self.discovery is not None:
+            self.discovery.cancel()
+
+    def untilInterrupted(self, files):
+        """ Yields the files until cancellation is requested. """
+        for file_path in files:
+            if self.isInterruptionRequested():
+                return
+            yield file_path
+
+    def run(self):
+        done = 0
+        processed_bytes = 0
+        all_unlocked = True
+        cancelled = False
+        results = self.batch_processor.run(self.untilInterrupted(self.files), self.range_sheets)
+        try:
+            for result in results:
+                done += 1
+                processed_bytes += result.get("input_bytes", 0)
+                if not result["ok"]:
+                    all_unlocked = False
+                self.fileFinished.emit(result)
+                self.progress.emit(done, self.total, processed_bytes, result["file"])
+                if self.isInterruptionRequested():
+                    cancelled = True
+                    break
+        except Exception as e:
+            logging.error(f"Error unlocking files: {e}")
+            all_unlocked = False
+        finally:
+            # Closing the generator shuts the pool down, cancelling the files that were not started.
+            results.close()
+            # A directory walk that is still discovering files stops its threads, and the paths are released.
+            if hasattr(self.files, "close"):
+                self.files.close()
+            self.files = None
+        self.batchFinished.emit(all_unlocked, cancelled)
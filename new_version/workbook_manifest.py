@@ -0,0 +1,186 @@
+import os
+import posixpath
+import threading
+import zipfile
+from collections import OrderedDict, namedtuple
+from xml.etree import ElementTree
+
+WORKBOOK_PART = "xl/workbook.xml"
+WORKBOOK_RELS_PART = "xl/_rels/workbook.xml.rels"
+
+# Transitional and Strict OOXML namespaces.
+_MAIN_NAMESPACES = ("http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+                    "http://purl.oclc.org/ooxml/spreadsheetml/main")
+_RELATIONSHIP_ID_ATTRIBUTES = ("{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id",
+                               "{http://purl.oclc.org/ooxml/officeDocument/relationships}id")
+_PACKAGE_RELS_NAMESPACE = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+SheetEntry = namedtuple("SheetEntry", ["index", "name", "sheet_id", "state", "part"])
+SheetEntry.__doc__ = """
+Sheet of a workbook, in workbook order.
+
+Attributes:
+    index (int): Position of the sheet in the workbook, starting at 1.
+    name (str): Sheet name as shown on the tab.
+    sheet_id (int): sheetId attribute of the sheet.
+    state (str): 'visible', 'hidden' or 'veryHidden'.
+    part (str): Archive member that holds the sheet, e.g. 'xl/worksheets/sheet1.xml'. None if the archive does not
+        have it.
+"""
+
+
+class WorkbookManifest:
+    """
+    Sheets of a workbook read from xl/workbook.xml and its relationships, without loading the rest of the archive.
+    """
+
+    def __init__(self, sheets):
+        """
+        Args:
+            sheets (list): SheetEntry items in workbook order.
+        """
+        self.sheets = sheets
+        self._by_name = {sheet.name.casefold(): sheet for sheet in sheets if sheet.name is not None}
+
+    def find(self, sheet):
+        """
+        Looks up a sheet by its position in the workbook or by its name (case insensitive).
+
+        Args:
+            sheet (int | str): Position starting at 1, or sheet name.
+
+        Returns:
+            SheetEntry: The sheet, or None if the workbook has no such sheet.
+        """
+        if isinstance(sheet, int):
+            return self.sheets[sheet - 1] if 1 <= sheet <= len(self.sheets) else None
+        return self._by_name.get(sheet.casefold())
+
+    @property
+    def sheet_names(self):
+        """ list: Names of the sheets in workbook order. """
+        return [sheet.name for sheet in self.sheets]
+
+    def __len__(self):
+        return len(self.sheets)
+
+
+class ManifestCache:
+    """
+    LRU cache of workbook manifests keyed by path, size and modification time, so a workbook is parsed once no
+    matter how many validators ask for its sheets. A file that changes on disk gets a new entry.
+    """
+
+    def __init__(self, max_entries=1024):
+        """
+        Args:
+            max_entries (int): Number of manifests kept before the least recently used one is evicted.
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """
+        Returns the manifest of a workbook, reading it only if it is not cached for the current size and mtime.
+
+        Args:
+            path (str): Path to the workbook.
+
+        Returns:
+            WorkbookManifest: Sheets of the workbook.
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            manifest = self._entries.get(key)
+            if manifest is not None:
+                self._entries.move_to_end(key)
+                return manifest
+        manifest = read_workbook_manifest(path)
+        with self._lock:
+            self._entries[key] = manifest
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return manifest
+
+    def clear(self):
+        """ Removes every cached manifest. """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def read_workbook_manifest(source):
+    """
+    Reads the sheet names, order, state and part paths of a workbook. Only xl/workbook.xml and
+    xl/_rels/workbook.xml.rels are decompressed, and xl/workbook.xml is parsed only up to the end of <sheets>.
+
+    Args:
+        source (str | file | zipfile.ZipFile): Path, binary file object or open archive of the workbook.
+
+    Returns:
+        WorkbookManifest: Sheets of the workbook.
+
+    Raises:
+        zipfile.BadZipFile: If source is not a ZIP archive, or is one without a workbook (e.g. a .docx).
+    """
+    if isinstance(source, zipfile.ZipFile):
+        return _read_manifest(source)
+    with zipfile.ZipFile(source, "r") as zip_ref:
+        return _read_manifest(zip_ref)
+
+
+def _read_manifest(zip_ref):
+    for part in (WORKBOOK_PART, WORKBOOK_RELS_PART):
+        try:
+            zip_ref.getinfo(part)
+        except KeyError:
+            raise zipfile.BadZipFile(f"Not a workbook, the archive has no {part}") from None
+    try:
+        return _parse_manifest(zip_ref)
+    except ElementTree.ParseError as e:
+        raise zipfile.BadZipFile(f"Not a workbook, malformed XML in its index: {e}") from e
+
+
+def _parse_manifest(zip_ref):
+    targets = _read_relationship_targets(zip_ref)
+    # A relationship to a member that is not in the archive leaves the sheet without a part.
+    members = set(zip_ref.namelist())
+    sheets = []
+    with zip_ref.open(WORKBOOK_PART) as workbook:
+        for event, element in ElementTree.iterparse(workbook, events=("end",)):
+            namespace, _, tag = element.tag.rpartition("}")
+            if namespace[1:] not in _MAIN_NAMESPACES:
+                continue
+            if tag == "sheet":
+                relationship_id = next((element.get(attribute) for attribute in _RELATIONSHIP_ID_ATTRIBUTES
+                                        if element.get(attribute) is not None), None)
+                part = targets.get(relationship_id)
+                sheets.append(SheetEntry(len(sheets) + 1, element.get("name"), int(element.get("sheetId", 0)),
+                                         element.get("state", "visible"), part if part in members else None))
+            elif tag == "sheets":
+                break
+    return WorkbookManifest(sheets)
+
+
+def _read_relationship_targets(zip_ref):
+    """
+    Maps the relationship ids of the workbook to the archive members they point to.
+    """
+    targets = {}
+    base = posixpath.dirname(WORKBOOK_PART)
+    with zip_ref.open(WORKBOOK_RELS_PART) as rels:
+        for element in ElementTree.parse(rels).getroot().iter(f"{{{_PACKAGE_RELS_NAMESPACE}}}Relationship"):
+            if element.get("TargetMode") == "External":
+                continue
+            target = element.get("Target", "")
+            if target.startswith("/"):
+                part = target.lstrip("/")
+            else:
+                part = posixpath.normpath(posixpath.join(base, target))
+            targets[element.get("Id")] = part
+    return targets